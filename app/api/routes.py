@@ -1,6 +1,23 @@
+import asyncio
 import json
-import numpy as np
-from fastapi import APIRouter, HTTPException
+import os
+from typing import List
+from fastapi import (
+    APIRouter,
+    Body,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+)
+from fastapi.responses import (
+    FileResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from app.models import (
     ImageResponse,
     TextImageRequest,
@@ -8,373 +25,434 @@ from app.models import (
     BackgroundRemovalRequest,
     ImageVariationRequest,
     InPaintingRequest,
+    OutPaintingRequest,
+    ResponseModeEnum,
 )
-from app.utils import save_image
+from pydantic import ValidationError
+from app.utils import encode_file
 import base64
-from app.core import GenerateImagePrePrompt, SearchPrePrompt
-from app.core import get_images
-
+from app.core import PromptOptimizer
+from app.core import ProductSearch
+from app.core import create_pipeline
+from app.core import ThrottledError
+from app.core import metrics
+from app.core.clients import pool_stats
+from app.core.batch import fan_out, iter_items, parse_ndjson
+from app.core.jobs import QueueFullError, create_job_queue
+from app.core.preprocess import InvalidImageError
+
+
+def generation_error(error):
+    """
+    Map an exception raised while generating images to an HTTP status.
+
+    Returns:
+        tuple: ``(status_code, detail)``.
+    """
+    if isinstance(error, (ValidationError, InvalidImageError)):
+        return 422, str(error)
+    if isinstance(error, ThrottledError):
+        return 429, f"Too many requests: {error}"
+    return 500, f"Error generating image: {error}"
 
-router = APIRouter()
 
 image_pre_prompt = "For helping you comprehensive understand the prompt, you could assume that input vocabularies are all about a computer. For example, the case could refer to computer case, the cooler could refer to computer cooler."
 
 
 def create_router(config):
-    bedrock_client = config["bedrock_client"]
+    router = APIRouter()
+    invoker = config["invoker"]
     image_model = config["image_model"]
     output_dir = config["output_dir"]
     bedrock_agent = config["bedrock_agent_client"]
     s3_client = config["s3_client"]
+    result_cache = config.get("result_cache")
+    product_cache = config.get("product_cache")
+    single_flight = config.get("single_flight")
+    prompt_cache = config.get("prompt_cache")
+    optimizer = PromptOptimizer(invoker, cache=prompt_cache)
+    product_search = ProductSearch(
+        invoker,
+        optimizer,
+        bedrock_agent,
+        s3_client,
+        product_cache,
+        optimize_deadline=config.get("search_optimize_deadline", 1.5),
+        retriever=config.get("retriever"),
+    )
+    pipeline = create_pipeline(
+        invoker,
+        image_model,
+        output_dir,
+        image_pre_prompt,
+        cache=result_cache,
+        output_format=config.get("output_format", "png"),
+        thumbnail_size=config.get("thumbnail_size"),
+        single_flight=single_flight,
+        writer=config.get("image_writer"),
+        preprocessor=config.get("input_preprocessor"),
+    )
+    job_queue = create_job_queue(pipeline)
+    job_tasks = {
+        "text-to-image": (TaskTypeEnum.TEXT_IMAGE, TextImageRequest),
+        "inpainting": (TaskTypeEnum.INPAINTING, InPaintingRequest),
+        "outpainting": (TaskTypeEnum.OUTPAINTING, OutPaintingRequest),
+        "variation": (TaskTypeEnum.IMAGE_VARIATION, ImageVariationRequest),
+        "remove-bg": (TaskTypeEnum.BACKGROUND_REMOVAL, BackgroundRemovalRequest),
+    }
+
+    async def generate(task_type, request, response_mode=ResponseModeEnum.both):
+        metrics.observe_since_request("request_parse")
+        try:
+            return await pipeline.run(task_type, request, response_mode)
+        except Exception as e:
+            status_code, detail = generation_error(e)
+            raise HTTPException(status_code=status_code, detail=detail)
 
     @router.post("/test", response_model=ImageResponse)
     async def test():
+        """Test endpoint to check if the API is working"""
         with open("output/01-text-to-image_seed-1.png", "rb") as image_file:
             reference_image_base64 = base64.b64encode(image_file.read()).decode("utf-8")
-        """Test endpoint to check if the API is working"""
 
-        print("Generating image...")
-        print("image model:", image_model)
-        body = json.dumps(
-            {
-                "taskType": "INPAINTING",
-                "inPaintingParams": {
-                    "text": "a white tshirt with a oliver tree graphic",
-                    "negativeText": "animal;people;green;man",
-                    "maskPrompt": "dog image",
-                    "image": reference_image_base64,
-                },
-                "imageGenerationConfig": {
-                    "numberOfImages": 1,
-                    "cfgScale": 6.5,
-                    "seed": 0,
-                    "quality": "standard",
-                },
-            }
-        )
-        with open("request_body.json", "w") as file:
-            file.write(body)
-
-        # image_generation_model_id = "amazon.nova-canvas-v1:0"
-        response = bedrock_client.invoke_model(
-            body=body,
-            modelId=image_model,
-            accept="application/json",
-            contentType="application/json",
+        request = InPaintingRequest(
+            inPaintingParams={
+                "text": "a white tshirt with a oliver tree graphic",
+                "negativeText": "animal;people;green;man",
+                "maskPrompt": "dog image",
+                "image": reference_image_base64,
+            },
+            imageGenerationConfig={
+                "numberOfImages": 1,
+                "cfgScale": 6.5,
+                "quality": "standard",
+            },
         )
-
-        response_body = json.loads(response.get("body").read())
-
-        base64_images = response_body.get("images", [])
-
-        image_paths = []
-        for i, base64_image in enumerate(base64_images):
-            # Generate a unique filename
-            image_path = f"{output_dir}/text-to-image_{int(np.random.random() * 1000000)}_{i}.png"
-            save_image(base64_image, image_path)
-            image_paths.append(image_path)
-
-        return {"image_paths": image_path, "base64_images": base64_images}
+        return await generate(TaskTypeEnum.INPAINTING, request)
 
     @router.post("/inpainting", response_model=ImageResponse)
-    async def inpainting(request: InPaintingRequest):
+    async def inpainting(
+        request: InPaintingRequest,
+        response_mode: ResponseModeEnum = ResponseModeEnum.both,
+    ):
         """Generate image based on references iamges(max=5)"""
+        return await generate(TaskTypeEnum.INPAINTING, request, response_mode)
 
-        request.inPaintingParams.text = (
-            f"{image_pre_prompt} {request.inPaintingParams.text}"
-        )
-        request.imageGenerationConfig.seed = np.random.randint(1, 1000001)
-        body = json.dumps(
-            {
-                "taskType": TaskTypeEnum.INPAINTING,
-                "inPaintingParams": request.inPaintingParams.dict(exclude_none=True),
-                "imageGenerationConfig": request.imageGenerationConfig.dict(
-                    exclude_none=True
-                ),
+    async def encode_upload(upload):
+        if upload is None:
+            return None
+        return await asyncio.to_thread(encode_file, upload.file)
+
+    def build_upload_request(request_model, config=None, **fields):
+        try:
+            # Omitted optional form fields fall back to the model defaults
+            fields = {
+                name: {key: value for key, value in params.items() if value is not None}
+                for name, params in fields.items()
             }
+            if config is not None:
+                fields["imageGenerationConfig"] = json.loads(config)
+            return request_model(**fields)
+        except (ValidationError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    @router.post("/inpainting/upload", response_model=ImageResponse)
+    async def inpainting_upload(
+        text: str = Form(...),
+        image: UploadFile = File(...),
+        maskImage: UploadFile = File(None),
+        maskPrompt: str = Form(None),
+        negativeText: str = Form(None),
+        imageGenerationConfig: str = Form("{}"),
+        response_mode: ResponseModeEnum = ResponseModeEnum.both,
+    ):
+        """Inpainting with the image and mask uploaded as multipart files"""
+        request = build_upload_request(
+            InPaintingRequest,
+            inPaintingParams={
+                "text": text,
+                "negativeText": negativeText,
+                "image": await encode_upload(image),
+                "maskPrompt": maskPrompt,
+                "maskImage": await encode_upload(maskImage),
+            },
+            config=imageGenerationConfig,
         )
-        try:
-            response = bedrock_client.invoke_model(
-                body=body,
-                modelId=image_model,
-                accept="application/json",
-                contentType="application/json",
-            )
-
-            response_body = json.loads(response.get("body").read())
-            base64_images = response_body.get("images", [])
+        return await generate(TaskTypeEnum.INPAINTING, request, response_mode)
 
-            image_paths = []
-            for i, base64_image in enumerate(base64_images):
-                # Generate a unique filename
-                image_path = f"{output_dir}/text-to-image_{int(np.random.random() * 1000000)}_{i}.png"
-                save_image(base64_image, image_path)
-                image_paths.append(image_path)
-
-            return {"image_paths": image_paths, "base64_images": base64_images}
-
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Error generating image: {str(e)}"
-            )
+    @router.post("/outpainting", response_model=ImageResponse)
+    async def outpainting(
+        request: OutPaintingRequest,
+        response_mode: ResponseModeEnum = ResponseModeEnum.both,
+    ):
+        """Extend the given image beyond its mask"""
+        return await generate(TaskTypeEnum.OUTPAINTING, request, response_mode)
 
     @router.post("/variation", response_model=ImageResponse)
-    async def generate_variation(request: ImageVariationRequest):
+    async def generate_variation(
+        request: ImageVariationRequest,
+        response_mode: ResponseModeEnum = ResponseModeEnum.both,
+    ):
         """Generate image based on references iamges(max=5)"""
-
-        request.imageVariationParams.text = (
-            f"{image_pre_prompt} {request.imageVariationParams.text}"
-        )
-        request.imageGenerationConfig.seed = np.random.randint(1, 1000001)
-        body = json.dumps(
-            {
-                "taskType": TaskTypeEnum.IMAGE_VARIATION,
-                "imageVariationParams": request.imageVariationParams.dict(),
-                "imageGenerationConfig": request.imageGenerationConfig.dict(),
-            }
+        return await generate(TaskTypeEnum.IMAGE_VARIATION, request, response_mode)
+
+    @router.post("/variation/upload", response_model=ImageResponse)
+    async def generate_variation_upload(
+        text: str = Form(...),
+        images: List[UploadFile] = File(...),
+        similarityStrength: float = Form(0.8),
+        imageGenerationConfig: str = Form("{}"),
+        response_mode: ResponseModeEnum = ResponseModeEnum.both,
+    ):
+        """Image variation with the reference images uploaded as multipart files"""
+        request = build_upload_request(
+            ImageVariationRequest,
+            imageVariationParams={
+                "text": text,
+                "images": [await encode_upload(image) for image in images],
+                "similarityStrength": similarityStrength,
+            },
+            config=imageGenerationConfig,
         )
-        try:
-            response = bedrock_client.invoke_model(
-                body=body,
-                modelId=image_model,
-                accept="application/json",
-                contentType="application/json",
-            )
-
-            response_body = json.loads(response.get("body").read())
-            base64_images = response_body.get("images", [])
-
-            image_paths = []
-            for i, base64_image in enumerate(base64_images):
-                # Generate a unique filename
-                image_path = f"{output_dir}/text-to-image_{int(np.random.random() * 1000000)}_{i}.png"
-                save_image(base64_image, image_path)
-                image_paths.append(image_path)
-
-            return {"image_paths": image_paths, "base64_images": base64_images}
-
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Error generating image: {str(e)}"
-            )
+        return await generate(TaskTypeEnum.IMAGE_VARIATION, request, response_mode)
 
     @router.post("/remove-bg", response_model=ImageResponse)
-    async def remove_bg(request: BackgroundRemovalRequest):
+    async def remove_bg(
+        request: BackgroundRemovalRequest,
+        response_mode: ResponseModeEnum = ResponseModeEnum.both,
+    ):
         """Remove given image background"""
-
-        body = json.dumps(
-            {
-                "taskType": TaskTypeEnum.BACKGROUND_REMOVAL,
-                "backgroundRemovalParams": request.backgroundRemovalParams.dict(
-                    exclude_none=True
-                ),
-            }
+        return await generate(TaskTypeEnum.BACKGROUND_REMOVAL, request, response_mode)
+
+    @router.post("/remove-bg/upload", response_model=ImageResponse)
+    async def remove_bg_upload(
+        image: UploadFile = File(...),
+        response_mode: ResponseModeEnum = ResponseModeEnum.both,
+    ):
+        """Remove the background of an image uploaded as a multipart file"""
+        request = build_upload_request(
+            BackgroundRemovalRequest,
+            backgroundRemovalParams={"image": await encode_upload(image)},
         )
-        print(body)
-        try:
-            response = bedrock_client.invoke_model(
-                body=body,
-                modelId=image_model,
-                accept="application/json",
-                contentType="application/json",
-            )
-
-            response_body = json.loads(response.get("body").read())
-            base64_images = response_body.get("images", [])
-
-            image_paths = []
-            for i, base64_image in enumerate(base64_images):
-                # Generate a unique filename
-                image_path = f"{output_dir}/text-to-image_{int(np.random.random() * 1000000)}_{i}.png"
-                save_image(base64_image, image_path)
-                image_paths.append(image_path)
-
-            return {"image_paths": image_paths, "base64_images": base64_images}
-
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Error generating image: {str(e)}"
-            )
+        return await generate(TaskTypeEnum.BACKGROUND_REMOVAL, request, response_mode)
 
     @router.post("/text-to-image", response_model=ImageResponse)
-    async def text_to_image(request: TextImageRequest):
+    async def text_to_image(
+        request: TextImageRequest,
+        response_mode: ResponseModeEnum = ResponseModeEnum.both,
+    ):
         """Generate images based on a text prompt"""
+        return await generate(TaskTypeEnum.TEXT_IMAGE, request, response_mode)
 
-        request.textImageParams.text = (
-            f"{image_pre_prompt} {request.textImageParams.text}"
-        )
-
-        request.imageGenerationConfig.seed = np.random.randint(1, 1000001)
-        body = json.dumps(
-            {
-                "taskType": TaskTypeEnum.TEXT_IMAGE,
-                "textToImageParams": request.textImageParams.dict(exclude_none=True),
-                "imageGenerationConfig": request.imageGenerationConfig.dict(
-                    exclude_none=True
-                ),
-            }
-        )
-
-        print(body)
-        try:
-            print(image_model)
-            response = bedrock_client.invoke_model(
-                body=body,
-                modelId=image_model,
-                accept="application/json",
-                contentType="application/json",
-            )
-
-            response_body = json.loads(response.get("body").read())
-            base64_images = response_body.get("images", [])
-
-            image_paths = []
-            for i, base64_image in enumerate(base64_images):
-                # Generate a unique filename
-                image_path = f"{output_dir}/text-to-image_{int(np.random.random() * 1000000)}_{i}.png"
-                save_image(base64_image, image_path)
-                image_paths.append(image_path)
-
-            return {"image_paths": image_paths, "base64_images": base64_images}
+    @router.post("/batch/text-to-image")
+    async def batch_text_to_image(
+        http_request: Request,
+        response_mode: ResponseModeEnum = ResponseModeEnum.reference,
+    ):
+        """
+        Generate images for many prompts in one call.
 
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Error generating image: {str(e)}"
-            )
+        The body is a JSON list of text-to-image requests, or one request per
+        line with ``Content-Type: application/x-ndjson``. Results are streamed
+        back as NDJSON in completion order, one line per item with its
+        ``index`` and either ``result`` or ``error``.
+        """
+        if "ndjson" in http_request.headers.get("content-type", ""):
+            # The body is read up front: receiving it while the response
+            # streams would race the server's disconnect detection
+            items = iter_items(parse_ndjson(await http_request.body()))
+        else:
+            try:
+                body = await http_request.json()
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=f"Invalid JSON: {e}")
+            if not isinstance(body, list):
+                raise HTTPException(
+                    status_code=422, detail="Expected a list of requests"
+                )
+            items = iter_items(body)
+
+        async def handle(index, item):
+            try:
+                request = TextImageRequest.model_validate(item)
+                result = await pipeline.run(
+                    TaskTypeEnum.TEXT_IMAGE, request, response_mode
+                )
+            except Exception as e:
+                status_code, detail = generation_error(e)
+                return {
+                    "index": index,
+                    "status": "failed",
+                    "status_code": status_code,
+                    "error": detail,
+                }
+            return {"index": index, "status": "succeeded", "result": result}
+
+        async def lines():
+            async for result in fan_out(
+                items,
+                handle,
+                concurrency=config.get("batch_concurrency", 8),
+                max_items=config.get("batch_max_items", 1000),
+            ):
+                yield json.dumps(result) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def optimize_prompt(kind, request, stream):
+        if not stream:
+            try:
+                text = await optimizer.optimize(kind, request)
+            except ThrottledError as e:
+                raise HTTPException(status_code=429, detail=f"Too many requests: {e}")
+            return {"original_prompt": request, "optimized_prompt": text}
+
+        async def events():
+            text = ""
+            try:
+                async for delta in optimizer.stream(kind, request):
+                    if delta:
+                        text += delta
+                        yield f"data: {json.dumps({'text': delta})}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+                return
+            result = {"original_prompt": request, "optimized_prompt": text}
+            yield f"event: done\ndata: {json.dumps(result)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
 
     @router.post("/generate-prompt-optimize")
-    async def generate_prompt_optimize(request: str):
+    async def generate_prompt_optimize(request: str, stream: bool = False):
         """
         Optimize the generate prompt.
-        """
-        # Remove extra spaces and ensure proper formatting
-        text_model_id = "amazon.nova-pro-v1:0"
-        system_list = [
-            {
-                "text": "Yor are an assistant to user improve prompt, which is used to input a image generation AI model, so you need to make sure the prompt is clear and easy to understand by AI model."
-            },
-            {
-                "text": "For helping you comprehensive understand the prompt, you could assume that input vocabularies are all about a computer. For example, the case could refer to computer case, the cooler could refer to computer cooler."
-            },
-            {
-                "text": "Your output should be directly used as the input of image generation AI model, so you don't need to add any extra information."
-            },
-        ]
-
-        # Define one or more messages using the "user" and "assistant" roles.
-        message_list = [
-            {"role": "user", "content": [{"text": f"{GenerateImagePrePrompt} prompt"}]}
-        ]
-
-        # Configure the inference parameters.
-        inf_params = {"maxTokens": 500, "topP": 0.9, "topK": 20, "temperature": 0.7}
-        request_body = {
-            "schemaVersion": "messages-v1",
-            "messages": message_list,
-            "system": system_list,
-            "inferenceConfig": inf_params,
-        }
 
-        # Invoke the model with the response stream
-        response = bedrock_client.invoke_model_with_response_stream(
-            modelId=text_model_id, body=json.dumps(request_body)
-        )
-
-        stream = response.get("body")
-        text = ""
-        if stream:
-            for event in stream:
-                chunk = event.get("chunk")
-                chunk_json = json.loads(chunk.get("bytes").decode())
-                if "contentBlockDelta" in chunk_json:
-                    delta_text = chunk_json["contentBlockDelta"]["delta"]["text"]
-                    text += delta_text
-        return {"original_prompt": request, "optimized_prompt": text}
+        With ``stream=true`` the text is sent as server-sent events while the
+        model produces it, followed by a ``done`` event with the full result.
+        """
+        return await optimize_prompt("generate", request, stream)
 
     @router.post("/search-prompt-optimize")
-    async def search_prompt_optimize(request: str):
+    async def search_prompt_optimize(request: str, stream: bool = False):
         """
         Optimize the generate prompt.
-        """
-        # Remove extra spaces and ensure proper formatting
-        text_model_id = "amazon.nova-pro-v1:0"
-        system_list = [{"text": "MAKE SURE YOUR RESPONSE SHOULD UNDER 800 tokens."}]
-
-        # Define one or more messages using the "user" and "assistant" roles.
-        message_list = [
-            {"role": "user", "content": [{"text": f"{SearchPrePrompt} prompt"}]}
-        ]
-
-        # Configure the inference parameters.
-        inf_params = {"maxTokens": 500, "topP": 0.9, "topK": 20, "temperature": 0.7}
-        request_body = {
-            "schemaVersion": "messages-v1",
-            "messages": message_list,
-            "system": system_list,
-            "inferenceConfig": inf_params,
-        }
 
-        # Invoke the model with the response stream
-        response = bedrock_client.invoke_model_with_response_stream(
-            modelId=text_model_id, body=json.dumps(request_body)
-        )
-
-        stream = response.get("body")
-        text = ""
-        if stream:
-            for event in stream:
-                chunk = event.get("chunk")
-                chunk_json = json.loads(chunk.get("bytes").decode())
-                if "contentBlockDelta" in chunk_json:
-                    delta_text = chunk_json["contentBlockDelta"]["delta"]["text"]
-                    text += delta_text
-        text = text.replace("\n", "").replace("\\", "").replace("---", "")[:800]
-        return {"original_prompt": request, "optimized_prompt": text}
+        With ``stream=true`` the text is sent as server-sent events while the
+        model produces it, followed by a ``done`` event with the full result.
+        """
+        return await optimize_prompt("search", request, stream)
 
     @router.post("/search")
-    async def generate_prompt(request: str):
+    async def generate_prompt(
+        request: str, number_of_results: int = Query(1, ge=1, le=10)
+    ):
         """
         Optimized the search prompt then search the data.
         """
         try:
-            # optimize the prompt
-            print("optimizing prompt...")
-            optimized_prompt = await search_prompt_optimize(request)
-            print("optimized prompt:", optimized_prompt)
-            response = bedrock_agent.retrieve(
-                knowledgeBaseId="53EOF738SO",
-                retrievalQuery={"text": request},
-                retrievalConfiguration={
-                    "vectorSearchConfiguration": {"numberOfResults": 1}
-                },
-            )
-
-            s3_locations = []
-            results = []
-
-            for result in response["retrievalResults"]:
-                if "location" in result and "s3Location" in result["location"]:
-                    data = dict()
-                    s3_uri = result["location"]["s3Location"]["uri"]
-                    iamges = get_images(
-                        s3_client, s3_uri.replace("s3://cm-product-2025/", "")
-                    )
-                    data["image_urls"] = iamges
-                    results.append(data)
-
-            print(f"Total S3 locations found: {len(s3_locations)}")
-
-            # Return both the original results and the extracted S3 locations
-            return {
-                "original_prompt": optimized_prompt["original_prompt"],
-                "optimized_prompt": optimized_prompt["optimized_prompt"],
-                "results": results,
-                "s3_locations": s3_locations,
-            }
+            return await product_search.search(request, number_of_results)
+        except ThrottledError as e:
+            raise HTTPException(status_code=429, detail=f"Too many requests: {e}")
         except Exception as e:
             print(f"Error querying knowledge base: {e}")
             raise e
 
+    @router.post("/jobs/{task}", status_code=202)
+    async def submit_job(
+        task: str,
+        request: dict = Body(...),
+        response_mode: ResponseModeEnum = ResponseModeEnum.reference,
+    ):
+        """
+        Queue a generation and return its job ID right away.
+
+        ``task`` is one of the generation endpoints (``text-to-image``,
+        ``inpainting``, ``outpainting``, ``variation``, ``remove-bg``) and the
+        body is the same as for that endpoint.
+        """
+        if task not in job_tasks:
+            raise HTTPException(status_code=404, detail=f"Unknown task '{task}'")
+        task_type, request_model = job_tasks[task]
+        try:
+            request = request_model.model_validate(request)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        try:
+            job = job_queue.submit(task_type, request, response_mode)
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}",
+        }
+
+    def find_job(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    @router.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        """Poll a job; ``result`` holds the generation response once it succeeded"""
+        return find_job(job_id).to_dict()
+
+    @router.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str):
+        """Stream a job's status changes as server-sent events until it is done"""
+        job = find_job(job_id)
+
+        async def events():
+            async for update in job_queue.watch(job):
+                if update is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: {update.status}\ndata: {json.dumps(update.to_dict())}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @router.get("/images/{filename}")
+    async def download_image(filename: str):
+        """
+        Serve a saved image, with HTTP range support, or redirect to its
+        presigned URL once it was uploaded to S3.
+        """
+        image_path = os.path.join(output_dir, os.path.basename(filename))
+        # With write-behind the file can still be in flight
+        await pipeline.writer.wait(image_path)
+        store = pipeline.writer.store
+        if store.remote:
+            key = store.key(image_path)
+            await store.wait(key)
+            if not os.path.isfile(image_path):
+                return RedirectResponse(store.url(key))
+        if not os.path.isfile(image_path):
+            raise HTTPException(status_code=404, detail="Image not found")
+        return FileResponse(image_path)
+
+    @router.get("/stats")
+    async def stats():
+        """Runtime counters of the generation path"""
+        return {
+            "invoker": invoker.stats(),
+            "result_cache": result_cache.stats() if result_cache else None,
+            "product_cache": product_cache.stats() if product_cache else None,
+            "prompt_cache": prompt_cache.stats() if prompt_cache else None,
+            "coalescing": single_flight.stats() if single_flight else None,
+            "jobs": job_queue.stats(),
+            "writer": pipeline.writer.stats(),
+            "http_pools": pool_stats(),
+            "preprocess": pipeline.preprocessor.stats(),
+        }
+
+    @router.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        """Stage latency histograms and counters in the Prometheus text format"""
+        return PlainTextResponse(
+            metrics.render(), media_type="text/plain; version=0.0.4"
+        )
+
     @router.get("/")
     async def root():
         """API root endpoint with basic information"""
@@ -387,6 +465,21 @@ def create_router(config):
                     "method": "POST",
                     "description": "Generate images based on text prompts",
                 },
+                {
+                    "path": "/outpainting",
+                    "method": "POST",
+                    "description": "Extend an image beyond its borders",
+                },
+                {
+                    "path": "/batch/text-to-image",
+                    "method": "POST",
+                    "description": "Generate images for a list of prompts, streamed back as NDJSON",
+                },
+                {
+                    "path": "/jobs/{task}",
+                    "method": "POST",
+                    "description": "Queue a generation and poll /jobs/{job_id} for the result",
+                },
                 {
                     "path": "/text-image",
                     "method": "POST",
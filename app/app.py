@@ -1,15 +1,39 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import load_configuration
+from app.core import metrics, warm_product_cache
 from app.api.routes import create_router
 
 
-def create_app():
+def prefetch_products(config):
+    try:
+        count = warm_product_cache(config["s3_client"], config["product_cache"])
+        print(f"Prefetched {count} product objects")
+    except Exception as e:
+        print(f"Error prefetching product objects: {e}")
+
+
+def create_app(config=None):
+    # Load configuration, unless one is given (e.g. with stub clients)
+    if config is None:
+        config = load_configuration()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if config.get("product_prefetch"):
+            # Warm the product cache in the background, serving does not wait
+            asyncio.get_running_loop().run_in_executor(None, prefetch_products, config)
+        yield
+
     # Create FastAPI application
     app = FastAPI(
         title="Amazon Nova Canvas API",
         description="FastAPI service for Amazon Nova Canvas image generation capabilities",
         version="1.0.0",
+        lifespan=lifespan,
     )
 
     # Add CORS middleware
@@ -21,8 +45,21 @@ def create_app():
         allow_headers=["*"],
     )
 
-    # Load configuration
-    config = load_configuration()
+    @app.middleware("http")
+    async def instrument(request: Request, call_next):
+        started = time.perf_counter()
+        timings = metrics.start_request()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - started
+        # The route template keeps the label set bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.REQUEST_SECONDS.observe(elapsed, method=request.method, route=route)
+        metrics.REQUESTS.inc(
+            method=request.method, route=route, status=response.status_code
+        )
+        if config.get("server_timing"):
+            response.headers["Server-Timing"] = metrics.server_timing(timings, elapsed)
+        return response
 
     # Create and include router
     router = create_router(config)
@@ -31,4 +68,10 @@ def create_app():
     return app
 
 
-app = create_app()
+def __getattr__(name):
+    # Build the module-level app on first access (e.g. by uvicorn app.app:app),
+    # so importing create_app does not load the configuration from the environment
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
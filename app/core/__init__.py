@@ -1,4 +1,21 @@
 from .prompt import GenerateImagePrePrompt, SearchPrePrompt
-from .storage import get_images
+from .storage import PRODUCT_BUCKET, get_images, get_images_batch, warm_product_cache
+from .optimizer import PromptOptimizer
+from .search import ProductSearch
+from .pipeline import ImageGenerationPipeline, GenerationTask, create_pipeline
+from .throttle import ThrottledError
 
-__all__ = ["GenerateImagePrePrompt", "SearchPrePrompt", "get_images"]
+__all__ = [
+    "GenerateImagePrePrompt",
+    "SearchPrePrompt",
+    "PRODUCT_BUCKET",
+    "get_images",
+    "get_images_batch",
+    "warm_product_cache",
+    "PromptOptimizer",
+    "ProductSearch",
+    "ImageGenerationPipeline",
+    "GenerationTask",
+    "create_pipeline",
+    "ThrottledError",
+]
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+
+def parse_ndjson(data):
+    """
+    Decode an NDJSON body into one JSON value per non-blank line.
+
+    A line that is not valid JSON is kept as its raw text, so the caller can
+    report it as a failed item instead of failing the whole batch.
+    """
+    items = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(line.decode("utf-8", "replace"))
+    return items
+
+
+async def iter_items(items):
+    for item in items:
+        yield item
+
+
+async def fan_out(items, handle, concurrency=8, max_items=None):
+    """
+    Run ``handle(index, item)`` for every item with bounded concurrency and
+    yield the results in completion order.
+
+    Items are taken from ``items`` only as slots free up. Closing the
+    generator cancels the items still running.
+
+    Args:
+        items: Async iterable of batch items.
+        handle (callable): Coroutine function returning one result dict;
+            exceptions it raises are reported as failed items.
+        concurrency (int): Items processed at the same time.
+        max_items (int): Items accepted before the rest is refused.
+
+    Yields:
+        dict: One result per item, plus a final error when the batch was cut off.
+    """
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+    done = object()
+
+    async def run(index, item):
+        try:
+            results.put_nowait(await handle(index, item))
+        except Exception as e:
+            results.put_nowait({"index": index, "status": "failed", "error": str(e)})
+        finally:
+            slots.release()
+
+    async def feed():
+        index = 0
+        try:
+            async for item in items:
+                if max_items is not None and index >= max_items:
+                    results.put_nowait(
+                        {
+                            "index": index,
+                            "status": "failed",
+                            "error": f"Batch is limited to {max_items} items",
+                        }
+                    )
+                    break
+                await slots.acquire()
+                task = asyncio.create_task(run(index, item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                index += 1
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            results.put_nowait({"status": "failed", "error": str(e)})
+        finally:
+            results.put_nowait(done)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            result = await results.get()
+            if result is done:
+                return
+            yield result
+    finally:
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.core.clients import _env_number
+
+
+def canonical_key(*parts):
+    """
+    Hash JSON-serializable parts into a stable cache key.
+
+    Dict keys are sorted so two equal requests always hash the same,
+    regardless of field order.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache bounded by entry count, and optionally by
+    the total size callers report for their values.
+
+    Args:
+        max_entries (int): Entries kept before the least recently used is evicted.
+        max_bytes (int): Total size kept before the least recently used is
+            evicted, None for no size bound.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value, size=0):
+        if self.max_entries <= 0:
+            return
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Storing it would evict everything else
+            return
+        with self._lock:
+            self.bytes += size - self._sizes.get(key, 0)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                evicted, _ = self._data.popitem(last=False)
+                self.bytes -= self._sizes.pop(evicted)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    Byte blobs stored as files under ``directory``, evicted least recently
+    used first once their total size exceeds ``max_bytes``.
+
+    Args:
+        directory (str): Where the blobs are stored.
+        max_bytes (int): Capacity of the directory, 0 disables the cache.
+    """
+
+    def __init__(self, directory, max_bytes=1024**3, suffix=".bin"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._bytes = 0
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._bytes = sum(size for _, _, size in self._entries())
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @property
+    def size(self):
+        return self._bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            # Refresh mtime so eviction stays least-recently-used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key, data):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._bytes = total
+
+
+class ResultCache:
+    """
+    Two-tier cache of generated images: an in-memory LRU in front of a
+    ``DiskCache`` of JSON files. Both tiers are bounded by size, as a single
+    entry holds up to five multi-MB base64 images.
+
+    Args:
+        directory (str): Where the on-disk tier is stored.
+        max_entries (int): Entry capacity of the in-memory tier.
+        max_disk_bytes (int): Capacity of the on-disk tier, 0 disables it.
+        max_memory_bytes (int): Capacity of the in-memory tier.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_entries=32,
+        max_disk_bytes=1024**3,
+        max_memory_bytes=256 * 1024**2,
+    ):
+        self.memory = LRUCache(max_entries, max_memory_bytes)
+        self.disk = DiskCache(directory, max_disk_bytes, suffix=".json")
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up the images cached under ``key``.
+
+        Args:
+            key (str): Key built with ``canonical_key``.
+
+        Returns:
+            list: The cached base64 images, or None on a miss.
+        """
+        images = self.memory.get(key)
+        if images is None:
+            data = self.disk.get(key)
+            if data is not None:
+                images = json.loads(data)
+                self.memory.set(key, images, _images_size(images))
+                with self._lock:
+                    self.disk_hits += 1
+        with self._lock:
+            if images is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return images
+
+    def set(self, key, images):
+        self.memory.set(key, images, _images_size(images))
+        if self.disk.enabled:
+            self.disk.set(key, json.dumps(images).encode("utf-8"))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "disk_bytes": self.disk.size,
+        }
+
+
+def _images_size(images):
+    return sum(len(image) for image in images)
+
+
+class PromptCache:
+    """
+    Cache of optimized prompts with a time-to-live, held in an in-memory LRU
+    and, when ``directory`` is given, persisted as JSON files so that it
+    survives restarts.
+
+    Args:
+        max_entries (int): Capacity of the in-memory tier.
+        ttl (float): Seconds an optimized prompt stays valid.
+        directory (str): Optional directory of the persistent tier.
+        max_disk_bytes (int): Capacity of the persistent tier.
+    """
+
+    def __init__(
+        self, max_entries=1024, ttl=86400, directory=None, max_disk_bytes=64 * 1024**2
+    ):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskCache(directory, max_disk_bytes if directory else 0, ".json")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up the optimized prompt cached under ``key``.
+
+        Returns:
+            str: The cached text, or None when missing or expired.
+        """
+        entry = self.memory.get(key)
+        if entry is None:
+            data = self.disk.get(key)
+            if data is not None:
+                entry = json.loads(data)
+                self.memory.set(key, entry)
+        text = None
+        if entry is not None and entry["expires_at"] > time.time():
+            text = entry["text"]
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def set(self, key, text):
+        entry = {"text": text, "expires_at": time.time() + self.ttl}
+        self.memory.set(key, entry)
+        if self.disk.enabled:
+            self.disk.set(key, json.dumps(entry).encode("utf-8"))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_bytes": self.disk.size,
+        }
+
+
+def create_prompt_cache():
+    """
+    Build the prompt optimization cache from environment settings.
+
+    ``PROMPT_CACHE_DIR`` enables persistence across restarts.
+
+    Returns:
+        PromptCache: The configured cache.
+    """
+    return PromptCache(
+        max_entries=_env_number("PROMPT_CACHE_ENTRIES", 1024, int),
+        ttl=_env_number("PROMPT_CACHE_TTL", 86400, float),
+        directory=os.environ.get("PROMPT_CACHE_DIR") or None,
+    )
+
+
+def create_result_cache(output_dir):
+    """
+    Build the generation result cache from environment settings.
+
+    Args:
+        output_dir (str): The image output directory; the disk tier lives
+            under ``<output_dir>/cache`` unless ``RESULT_CACHE_DIR`` is set.
+
+    Returns:
+        ResultCache: The configured cache.
+    """
+    return ResultCache(
+        os.environ.get("RESULT_CACHE_DIR", os.path.join(output_dir, "cache")),
+        max_entries=_env_number("RESULT_CACHE_ENTRIES", 32, int),
+        max_disk_bytes=_env_number(
+            "RESULT_CACHE_DISK_BYTES", 1024**3, int, allow_zero=True
+        ),
+        max_memory_bytes=_env_number(
+            "RESULT_CACHE_MEMORY_BYTES", 256 * 1024**2, int, allow_zero=True
+        ),
+    )
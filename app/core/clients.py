@@ -0,0 +1,187 @@
+import os
+import threading
+from app.core.metrics import HTTP_POOL_IN_USE, HTTP_POOL_SATURATED, HTTP_POOL_SIZE
+
+_session = None
+_session_lock = threading.Lock()
+
+# Every monitored client by name, for /stats
+POOL_MONITORS = {}
+
+
+def get_session():
+    """
+    Return the process-wide boto3 session.
+
+    Clients created from one session share its loaded service models and
+    credential resolution, so each additional client is cheap to build.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import boto3
+
+                _session = boto3.Session()
+    return _session
+
+
+def _env_number(name, default, cast, allow_zero=False):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        number = cast(value)
+    except ValueError:
+        number = None
+    if allow_zero:
+        if number is None or number < 0:
+            raise ValueError(f"{name} must be a non-negative number, got '{value}'")
+    elif number is None or number <= 0:
+        raise ValueError(f"{name} must be a positive number, got '{value}'")
+    return number
+
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"{name} must be true or false, got '{value}'")
+
+
+def client_config(prefix, max_pool_connections=10, connect_timeout=10, read_timeout=60):
+    """
+    Read the connection settings of one client from the environment:
+    ``{prefix}_MAX_POOL_CONNECTIONS``, ``{prefix}_CONNECT_TIMEOUT``,
+    ``{prefix}_READ_TIMEOUT`` (seconds) and ``{prefix}_TCP_KEEPALIVE``.
+
+    Args:
+        prefix (str): Environment variable prefix, e.g. ``"S3"``.
+        max_pool_connections (int): Default pool size.
+        connect_timeout (float): Default connect timeout.
+        read_timeout (float): Default read timeout.
+
+    Returns:
+        dict: ``botocore.config.Config`` arguments.
+
+    Raises:
+        ValueError: When a setting is not a positive number or a boolean.
+    """
+    return {
+        "max_pool_connections": _env_number(
+            f"{prefix}_MAX_POOL_CONNECTIONS", max_pool_connections, int
+        ),
+        "connect_timeout": _env_number(
+            f"{prefix}_CONNECT_TIMEOUT", connect_timeout, float
+        ),
+        "read_timeout": _env_number(f"{prefix}_READ_TIMEOUT", read_timeout, float),
+        "tcp_keepalive": _env_flag(f"{prefix}_TCP_KEEPALIVE", True),
+    }
+
+
+class PoolMonitor:
+    """
+    Track how many HTTP requests a client has in flight against its
+    connection pool, from botocore's ``before-send`` and
+    ``response-received`` events.
+
+    botocore's pool does not block when it is exhausted: it opens a
+    throwaway connection instead. Requests sent while ``in_use`` already
+    equals ``size`` are counted as ``saturated``.
+
+    Streamed response bodies keep their connection after
+    ``response-received``, so ``in_use`` is a lower bound for streaming calls.
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.in_use = 0
+        self.peak = 0
+        self.saturated = 0
+        self._lock = threading.Lock()
+        HTTP_POOL_SIZE.set(size, client=name)
+        HTTP_POOL_IN_USE.set(0, client=name)
+
+    def before_send(self, **kwargs):
+        with self._lock:
+            if self.in_use >= self.size:
+                self.saturated += 1
+                HTTP_POOL_SATURATED.inc(client=self.name)
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+            HTTP_POOL_IN_USE.set(self.in_use, client=self.name)
+
+    def response_received(self, **kwargs):
+        with self._lock:
+            self.in_use -= 1
+            HTTP_POOL_IN_USE.set(self.in_use, client=self.name)
+
+    def attach(self, client):
+        client.meta.events.register("before-send", self.before_send)
+        client.meta.events.register("response-received", self.response_received)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "peak": self.peak,
+            "saturated": self.saturated,
+        }
+
+
+class LazyClient:
+    """
+    A boto3 client built on first use, from the shared session.
+
+    Attribute access is forwarded to the real client, so it can be passed
+    wherever a client is expected. With a ``name``, the client's connection
+    pool use is monitored.
+
+    Args:
+        service_name (str): The AWS service, e.g. ``"s3"``.
+        config (dict): Optional ``botocore.config.Config`` arguments.
+        name (str): Optional name the pool metrics are reported under.
+        **kwargs: Passed to ``Session.client``.
+    """
+
+    def __init__(self, service_name, config=None, name=None, **kwargs):
+        self._service_name = service_name
+        self._config = config
+        self._kwargs = kwargs
+        self._client = None
+        self._lock = threading.Lock()
+        self.monitor = None
+        if name is not None:
+            size = (config or {}).get("max_pool_connections", 10)
+            self.monitor = POOL_MONITORS[name] = PoolMonitor(name, size)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create()
+        return self._client
+
+    def _create(self):
+        kwargs = dict(self._kwargs)
+        if self._config is not None:
+            from botocore.config import Config
+
+            kwargs["config"] = Config(**self._config)
+        client = get_session().client(self._service_name, **kwargs)
+        if self.monitor is not None:
+            self.monitor.attach(client)
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def pool_stats():
+    return {name: monitor.stats() for name, monitor in POOL_MONITORS.items()}
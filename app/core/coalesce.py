@@ -0,0 +1,77 @@
+import asyncio
+from app.core.clients import _env_flag, _env_number
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls that share a key: the first caller starts
+    the call, and every caller with the same key awaits that same result.
+
+    After the call completes its result stays shared for ``window`` seconds,
+    so requests arriving right behind a burst coalesce too.
+
+    Args:
+        window (float): Seconds a finished result is still handed out.
+    """
+
+    def __init__(self, window=0.0):
+        self.window = window
+        self.calls = 0
+        self.shared = 0
+        self._tasks = {}
+
+    async def do(self, key, func):
+        """
+        Run ``func()`` once per key, or join the run already in flight.
+
+        The call runs as its own task, so a caller that disconnects does not
+        cancel the call for the callers sharing it.
+
+        Args:
+            key (str): The canonical request key.
+            func (callable): Coroutine function producing the result.
+
+        Returns:
+            The result of ``func()``.
+        """
+        task = self._tasks.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        # Failures are never shared beyond the callers already waiting
+        if self.window > 0 and not task.cancelled() and not task.exception():
+            asyncio.get_running_loop().call_later(self.window, self._forget, key, task)
+        else:
+            self._forget(key, task)
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "in_flight": sum(not task.done() for task in self._tasks.values()),
+        }
+
+
+def create_single_flight():
+    """
+    Build the generation coalescer from environment settings.
+
+    Returns:
+        SingleFlight: The coalescer, or None when ``GENERATION_COALESCING`` is off.
+    """
+    if not _env_flag("GENERATION_COALESCING", True):
+        return None
+    return SingleFlight(
+        window=_env_number("COALESCE_WINDOW", 0, float, allow_zero=True)
+    )
@@ -1,7 +1,13 @@
 import os
-import boto3
-from botocore.config import Config
 from dotenv import load_dotenv
+from app.core.cache import create_prompt_cache, create_result_cache
+from app.core.clients import LazyClient, _env_flag, _env_number, client_config
+from app.core.coalesce import create_single_flight
+from app.core.invoker import create_invoker
+from app.core.outputs import create_output_store
+from app.core.preprocess import create_input_preprocessor
+from app.core.product_cache import create_product_cache
+from app.core.writer import create_image_writer
 
 
 def load_configuration():
@@ -30,16 +36,10 @@ def load_configuration():
     output_dir = "output"
     os.makedirs(output_dir, exist_ok=True)
 
-    region = "us-east-1"
-    # Initialize Bedrock client
-    bedrock_runtime_client = boto3.client(
-        "bedrock-runtime",
-        region_name=region,
-        aws_access_key_id=aws_access_key,
-        aws_secret_access_key=aws_secret_key,
-        config=Config(
-            read_timeout=5 * 60,
-        ),
+    # Saved images keep the model's PNG bytes unless a transcode is requested
+    output_format = os.environ.get("OUTPUT_IMAGE_FORMAT", "png").lower()
+    thumbnail_size = (
+        _env_number("OUTPUT_THUMBNAIL_SIZE", 0, int, allow_zero=True) or None
     )
 
     # Get image generation model from environment
@@ -49,17 +49,97 @@ def load_configuration():
 
     print(f"Using image generation model: {image_generation_model}")
 
-    bedrock_agent = boto3.client("bedrock-agent-runtime", region_name=region)
-    s3_client = boto3.client(
+    clients = create_clients()
+    invoker = clients["invoker"]
+    retriever = None
+    if os.environ.get("RETRIEVAL_BACKEND", "remote").lower() != "remote":
+        # The local index needs numpy, which is not loaded otherwise
+        from app.core.retrieval import create_retriever
+
+        retriever = create_retriever(invoker)
+    return {
+        **clients,
+        "retriever": retriever,
+        "image_model": image_generation_model,
+        "output_dir": output_dir,
+        "output_format": output_format,
+        "thumbnail_size": thumbnail_size,
+        "image_writer": create_image_writer(
+            output_format, thumbnail_size, create_output_store(clients["s3_client"])
+        ),
+        "input_preprocessor": create_input_preprocessor(),
+        "result_cache": create_result_cache(output_dir),
+        "single_flight": create_single_flight(),
+        "product_cache": create_product_cache(output_dir),
+        "prompt_cache": create_prompt_cache(),
+        "search_optimize_deadline": _env_number(
+            "SEARCH_OPTIMIZE_DEADLINE", 1.5, float, allow_zero=True
+        ),
+        "server_timing": _env_flag("SERVER_TIMING", False),
+        "batch_concurrency": _env_number("BATCH_CONCURRENCY", 8, int),
+        "batch_max_items": _env_number("BATCH_MAX_ITEMS", 1000, int),
+        "product_prefetch": _env_flag("PRODUCT_CACHE_PREFETCH", False),
+    }
+
+
+def create_clients():
+    """
+    Build the AWS clients and the Bedrock invoker from environment settings.
+
+    Tools needing only these (e.g. ``python -m app.core.retrieval``) call it
+    on its own, ``load_configuration`` builds the rest of the app on top.
+
+    Returns:
+        dict: ``bedrock_client``, ``invoker``, ``bedrock_agent_client`` and
+        ``s3_client``.
+    """
+    aws_access_key = os.environ.get("AWS_ACCESS_KEY_ID", "example")
+    aws_secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY", "example")
+
+    region = "us-east-1"
+    # Connection settings are validated here, the clients themselves are
+    # built on first use so startup does not load service models
+    bedrock_workers = _env_number("BEDROCK_MAX_WORKERS", 32, int)
+    bedrock_config = client_config(
+        "BEDROCK",
+        # One pooled connection per invoker worker thread
+        max_pool_connections=bedrock_workers,
+        read_timeout=5 * 60,
+    )
+    if bedrock_config["max_pool_connections"] < bedrock_workers:
+        print(
+            f"Warning: BEDROCK_MAX_POOL_CONNECTIONS is below BEDROCK_MAX_WORKERS "
+            f"({bedrock_config['max_pool_connections']} < {bedrock_workers}), "
+            "extra connections will be opened and discarded under load"
+        )
+    bedrock_runtime_client = LazyClient(
+        "bedrock-runtime",
+        name="bedrock-runtime",
+        region_name=region,
+        aws_access_key_id=aws_access_key,
+        aws_secret_access_key=aws_secret_key,
+        # Retries and backoff are handled by the invoker
+        config=dict(bedrock_config, retries={"total_max_attempts": 1}),
+    )
+
+    bedrock_agent = LazyClient(
+        "bedrock-agent-runtime",
+        name="bedrock-agent-runtime",
+        region_name=region,
+        config=client_config("BEDROCK_AGENT", max_pool_connections=32),
+    )
+    s3_client = LazyClient(
         "s3",
+        name="s3",
         region_name="us-east-1",
         aws_access_key_id=aws_access_key,
         aws_secret_access_key=aws_secret_key,
+        # Shared by the concurrent product loads of a search
+        config=client_config("S3", max_pool_connections=32),
     )
     return {
         "bedrock_client": bedrock_runtime_client,
+        "invoker": create_invoker(bedrock_runtime_client),
         "bedrock_agent_client": bedrock_agent,
         "s3_client": s3_client,
-        "image_model": image_generation_model,
-        "output_dir": output_dir,
     }
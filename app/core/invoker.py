@@ -0,0 +1,387 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from app.core.clients import _env_number
+from app.core.metrics import (
+    BEDROCK_BUCKET_RATE,
+    BEDROCK_BUCKET_TOKENS,
+    BEDROCK_IN_FLIGHT,
+    BEDROCK_QUEUED,
+    BEDROCK_RETRIES,
+    BEDROCK_THROTTLES,
+    add_collector,
+    timed,
+)
+from app.core.throttle import (
+    ThrottledError,
+    TokenBucket,
+    backoff_delay,
+    is_retryable,
+    is_throttling,
+)
+
+
+def parse_model_limits(value):
+    """
+    Parse a per-model limit setting (concurrency, RPM or TPM).
+
+    Args:
+        value (str): Comma separated ``model_id=limit`` pairs,
+            e.g. ``"amazon.nova-canvas-v1:0=8,amazon.nova-pro-v1:0=16"``.
+
+    Returns:
+        dict: Mapping of model ID to its concurrency limit.
+    """
+    limits = {}
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model_id, _, limit = item.rpartition("=")
+        if not model_id:
+            raise ValueError(f"Invalid model limit '{item}', expected model_id=limit")
+        limits[model_id.strip()] = int(limit)
+    return limits
+
+
+class BedrockInvoker:
+    """
+    Run the blocking boto3 Bedrock calls on a bounded thread pool so the
+    event loop stays free while a generation is in flight.
+
+    Every model ID gets its own semaphore, so a burst of slow image
+    generations cannot starve the prompt-optimize calls (and vice versa).
+
+    Model calls are additionally smoothed and retried:
+
+    * Models with a configured requests-per-minute (``rpm_limits``) or
+      tokens-per-minute (``tpm_limits``) quota wait for a ``TokenBucket``.
+    * Throttling and transient errors are retried with jittered exponential
+      backoff, and each throttle also slows the model's bucket down.
+    * Each attempt waits at most ``queue_max_wait`` seconds for its turn
+      before failing with ``ThrottledError``. The time spent in the call
+      itself does not count against it. The default leaves room for a
+      queued request to wait out a full 20-60 s image generation.
+
+    Queue depth, in-flight calls and the bucket levels are exported as
+    gauges on ``/metrics``.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_workers=32,
+        default_limit=8,
+        model_limits=None,
+        rpm_limits=None,
+        tpm_limits=None,
+        queue_max_wait=120.0,
+        max_retries=4,
+        retry_base_delay=0.5,
+    ):
+        self.client = client
+        self.default_limit = default_limit
+        self.model_limits = dict(model_limits or {})
+        self.queue_max_wait = queue_max_wait
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bedrock"
+        )
+        self._request_buckets = {
+            model_id: TokenBucket(rpm) for model_id, rpm in (rpm_limits or {}).items()
+        }
+        self._token_buckets = {
+            model_id: TokenBucket(tpm) for model_id, tpm in (tpm_limits or {}).items()
+        }
+        self._semaphores = {}
+        self._in_flight = {}
+        self._queued = {}
+        self.throttles = {}
+        self.retries = {}
+        if self._request_buckets or self._token_buckets:
+            add_collector(self._collect_buckets)
+
+    def _collect_buckets(self):
+        for kind, buckets in (
+            ("requests", self._request_buckets),
+            ("tokens", self._token_buckets),
+        ):
+            for model_id, bucket in buckets.items():
+                BEDROCK_BUCKET_TOKENS.set(
+                    bucket.available(), model=model_id, bucket=kind
+                )
+                BEDROCK_BUCKET_RATE.set(bucket.rate * 60, model=model_id, bucket=kind)
+
+    def _count(self, counts, gauge, model_id, delta):
+        counts[model_id] = counts.get(model_id, 0) + delta
+        gauge.set(counts[model_id], model=model_id)
+
+    def _semaphore(self, model_id):
+        # Semaphores are created lazily so they bind to the running loop.
+        if model_id not in self._semaphores:
+            limit = self.model_limits.get(model_id, self.default_limit)
+            self._semaphores[model_id] = asyncio.Semaphore(limit)
+        return self._semaphores[model_id]
+
+    async def _acquire(self, model_id, cost_tokens=0, deadline=None):
+        self._count(self._queued, BEDROCK_QUEUED, model_id, 1)
+        try:
+            if deadline is not None:
+                if model_id in self._request_buckets:
+                    await self._request_buckets[model_id].acquire(1, deadline)
+                if cost_tokens and model_id in self._token_buckets:
+                    await self._token_buckets[model_id].acquire(cost_tokens, deadline)
+            try:
+                await asyncio.wait_for(
+                    self._semaphore(model_id).acquire(),
+                    None if deadline is None else max(deadline - time.monotonic(), 0),
+                )
+            except asyncio.TimeoutError:
+                raise ThrottledError("Request queue wait exceeded")
+        finally:
+            self._count(self._queued, BEDROCK_QUEUED, model_id, -1)
+        self._count(self._in_flight, BEDROCK_IN_FLIGHT, model_id, 1)
+
+    def _release(self, model_id):
+        self._count(self._in_flight, BEDROCK_IN_FLIGHT, model_id, -1)
+        self._semaphore(model_id).release()
+
+    def _should_retry(self, model_id, error, attempt):
+        if is_throttling(error):
+            self.throttles[model_id] = self.throttles.get(model_id, 0) + 1
+            BEDROCK_THROTTLES.inc(model=model_id)
+            for buckets in (self._request_buckets, self._token_buckets):
+                if model_id in buckets:
+                    buckets[model_id].throttled()
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        self.retries[model_id] = self.retries.get(model_id, 0) + 1
+        BEDROCK_RETRIES.inc(model=model_id)
+        return True
+
+    def _succeeded(self, model_id):
+        for buckets in (self._request_buckets, self._token_buckets):
+            if model_id in buckets:
+                buckets[model_id].succeeded()
+
+    def _raise_failure(self, error):
+        if is_throttling(error):
+            raise ThrottledError(str(error)) from error
+        raise error
+
+    async def run(self, model_id, func, *args, **kwargs):
+        """
+        Run ``func`` on the executor while holding the model's slot.
+
+        Args:
+            model_id (str): Model the call is accounted against.
+            func (callable): Blocking callable to execute.
+
+        Returns:
+            The return value of ``func``.
+        """
+        loop = asyncio.get_running_loop()
+        await self._acquire(model_id)
+        try:
+            return await loop.run_in_executor(
+                self.executor, partial(func, *args, **kwargs)
+            )
+        finally:
+            self._release(model_id)
+
+    def _invoke_model_sync(self, body, model_id):
+        response = self.client.invoke_model(
+            body=body,
+            modelId=model_id,
+            accept="application/json",
+            contentType="application/json",
+        )
+        return json.loads(response.get("body").read())
+
+    async def invoke_model(self, body, model_id):
+        """
+        Invoke a model and return its parsed JSON response body.
+
+        Args:
+            body (str): Serialized request body.
+            model_id (str): The Bedrock model ID.
+
+        Returns:
+            dict: The decoded response body.
+
+        Raises:
+            ThrottledError: When Bedrock kept throttling or the queue wait ran out.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in itertools.count():
+            # The wait bound covers the queue only, not the previous attempt
+            deadline = time.monotonic() + self.queue_max_wait
+            with timed("bedrock_queue"):
+                await self._acquire(model_id, deadline=deadline)
+            try:
+                with timed("bedrock"):
+                    result = await loop.run_in_executor(
+                        self.executor, self._invoke_model_sync, body, model_id
+                    )
+            except Exception as e:
+                if not self._should_retry(model_id, e, attempt):
+                    self._raise_failure(e)
+            else:
+                self._succeeded(model_id)
+                return result
+            finally:
+                self._release(model_id)
+            await asyncio.sleep(backoff_delay(attempt, self.retry_base_delay))
+
+    def _iter_text_sync(self, body, model_id, cancelled):
+        response = self.client.invoke_model_with_response_stream(
+            modelId=model_id, body=body
+        )
+        stream = response.get("body")
+        if not stream:
+            return
+        for event in stream:
+            if cancelled.is_set():
+                break
+            chunk = event.get("chunk")
+            chunk_json = json.loads(chunk.get("bytes").decode())
+            if "contentBlockDelta" in chunk_json:
+                yield chunk_json["contentBlockDelta"]["delta"]["text"]
+
+    async def _stream_once(self, body, model_id):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for text in self._iter_text_sync(body, model_id, cancelled):
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        try:
+            loop.run_in_executor(self.executor, produce)
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    async def stream_text(self, body, model_id):
+        """
+        Invoke a text model with a response stream and yield each
+        ``contentBlockDelta`` text as soon as it arrives.
+
+        The boto3 event stream is consumed on the executor and handed to the
+        event loop through a queue. Closing the generator early stops the
+        consumer thread. A call is only retried if it failed before the
+        first delta.
+
+        Args:
+            body (str): Serialized request body.
+            model_id (str): The Bedrock model ID.
+
+        Yields:
+            str: Text deltas in order.
+        """
+        cost_tokens = estimate_tokens(body)
+        for attempt in itertools.count():
+            started = False
+            deadline = time.monotonic() + self.queue_max_wait
+            with timed("bedrock_queue"):
+                await self._acquire(model_id, cost_tokens, deadline)
+            try:
+                async for text in self._stream_once(body, model_id):
+                    started = True
+                    yield text
+            except Exception as e:
+                if started or not self._should_retry(model_id, e, attempt):
+                    self._raise_failure(e)
+            else:
+                self._succeeded(model_id)
+                return
+            finally:
+                self._release(model_id)
+            await asyncio.sleep(backoff_delay(attempt, self.retry_base_delay))
+
+    async def invoke_model_text(self, body, model_id):
+        """
+        Invoke a text model with a response stream and return the full text.
+
+        Args:
+            body (str): Serialized request body.
+            model_id (str): The Bedrock model ID.
+
+        Returns:
+            str: The concatenated ``contentBlockDelta`` text.
+        """
+        return "".join([text async for text in self.stream_text(body, model_id)])
+
+    def stats(self):
+        models = set(self.model_limits) | set(self._in_flight) | set(self._queued)
+        return {
+            "in_flight": dict(self._in_flight),
+            "queued": dict(self._queued),
+            "throttles": dict(self.throttles),
+            "retries": dict(self.retries),
+            "limits": {
+                model_id: self.model_limits.get(model_id, self.default_limit)
+                for model_id in models
+            },
+            "effective_rpm": {
+                model_id: bucket.rate * 60
+                for model_id, bucket in self._request_buckets.items()
+            },
+        }
+
+
+def estimate_tokens(body):
+    """
+    Rough token cost of a text model request for tokens-per-minute quotas:
+    the output budget plus about one token per four input characters.
+    """
+    try:
+        request = json.loads(body)
+    except ValueError:
+        return 0
+    max_tokens = request.get("inferenceConfig", {}).get("maxTokens", 0)
+    return max_tokens + len(json.dumps(request.get("messages", []))) // 4
+
+
+def create_invoker(client):
+    """
+    Build the shared invoker from environment settings.
+
+    Args:
+        client: The ``bedrock-runtime`` boto3 client.
+
+    Returns:
+        BedrockInvoker: The configured invoker.
+    """
+    return BedrockInvoker(
+        client,
+        max_workers=_env_number("BEDROCK_MAX_WORKERS", 32, int),
+        default_limit=_env_number("BEDROCK_MODEL_CONCURRENCY", 8, int),
+        model_limits=parse_model_limits(os.environ.get("BEDROCK_MODEL_LIMITS", "")),
+        rpm_limits=parse_model_limits(os.environ.get("BEDROCK_RPM_LIMITS", "")),
+        tpm_limits=parse_model_limits(os.environ.get("BEDROCK_TPM_LIMITS", "")),
+        queue_max_wait=_env_number("BEDROCK_QUEUE_MAX_WAIT", 120, float),
+        max_retries=_env_number("BEDROCK_MAX_RETRIES", 4, int, allow_zero=True),
+        retry_base_delay=_env_number(
+            "BEDROCK_RETRY_BASE_DELAY", 0.5, float, allow_zero=True
+        ),
+    )
@@ -0,0 +1,187 @@
+import asyncio
+import time
+import uuid
+from app.models import ResponseModeEnum
+from app.core.clients import _env_number
+
+
+class QueueFullError(Exception):
+    """The job queue already holds ``max_queued`` pending jobs."""
+
+
+class Job:
+    """
+    One submitted generation and its progress.
+
+    ``status`` moves from ``queued`` to ``running`` to ``succeeded`` or
+    ``failed``. Every change bumps ``version`` and wakes status watchers.
+    """
+
+    def __init__(self, task_type, request, response_mode):
+        self.id = uuid.uuid4().hex
+        self.task_type = task_type
+        self.request = request
+        self.response_mode = response_mode
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self.changed = asyncio.Event()
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def update(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        if status == "running":
+            self.started_at = time.time()
+        elif self.done:
+            self.finished_at = time.time()
+            # The request holds the input images, it is not needed anymore
+            self.request = None
+        self.version += 1
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "task_type": self.task_type,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Run generations in the background on a fixed number of workers.
+
+    Submitting returns right away with a job ID; ``workers`` jobs run at a
+    time, so the Bedrock work is capped independently of how many HTTP
+    connections are open. Finished jobs are kept for ``retention`` seconds.
+
+    Args:
+        pipeline (ImageGenerationPipeline): The pipeline jobs run on.
+        workers (int): Jobs running at the same time.
+        max_queued (int): Pending jobs accepted before submits are refused.
+        retention (float): Seconds a finished job can still be fetched.
+    """
+
+    def __init__(self, pipeline, workers=4, max_queued=100, retention=3600):
+        self.pipeline = pipeline
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    def _start(self):
+        # Workers are started lazily so they bind to the running loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_queued)
+            self._tasks = [
+                asyncio.create_task(self._work()) for _ in range(self.workers)
+            ]
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                job.update("running")
+                result = await self.pipeline.run(
+                    job.task_type, job.request, job.response_mode
+                )
+                job.update("succeeded", result=result)
+            except Exception as e:
+                print(f"Error running job {job.id}: {e}")
+                job.update("failed", error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _expire(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self.jobs.items()):
+            if job.done and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    def submit(self, task_type, request, response_mode=ResponseModeEnum.reference):
+        """
+        Queue a generation.
+
+        Args:
+            task_type (TaskTypeEnum): The registered pipeline task.
+            request: The validated request model.
+            response_mode (ResponseModeEnum): How the result returns images.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            QueueFullError: When ``max_queued`` jobs are already pending.
+        """
+        self._start()
+        self._expire()
+        job = Job(task_type, request, response_mode)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Job queue is full")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def watch(self, job, timeout=15.0):
+        """
+        Yield the job every time its status changes, until it is done.
+
+        Yields ``None`` when nothing changed for ``timeout`` seconds, so
+        callers can send keep-alives.
+        """
+        version = None
+        while True:
+            if job.version != version:
+                version = job.version
+                yield job
+                if job.done:
+                    return
+            try:
+                await asyncio.wait_for(job.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                yield None
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "jobs": counts}
+
+
+def create_job_queue(pipeline):
+    """
+    Build the background job queue from environment settings.
+
+    Args:
+        pipeline (ImageGenerationPipeline): The pipeline jobs run on.
+
+    Returns:
+        JobQueue: The job queue.
+    """
+    return JobQueue(
+        pipeline,
+        workers=_env_number("JOB_WORKERS", 4, int),
+        max_queued=_env_number("JOB_QUEUE_MAX", 100, int),
+        retention=_env_number("JOB_RETENTION", 3600, float),
+    )
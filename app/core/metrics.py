@@ -0,0 +1,269 @@
+"""
+Process-wide latency histograms and counters, rendered in the Prometheus
+text format by ``/metrics``.
+
+Stages are timed with ``timed(stage)``. Inside a request, the stage
+durations are also collected for the ``Server-Timing`` header; work on
+executor threads only reaches the histograms.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+# Callables refreshing gauges right before rendering
+_collectors = []
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+_request_started = contextvars.ContextVar("request_started", default=None)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, **extra):
+        pairs = list(zip(self.labelnames, key)) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = [
+            (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+            for name, value in pairs
+        ]
+        return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, key, value):
+        return [f"{self.name}{self._labels(key)} {value}"]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self, key, value):
+        return [f"{self.name}{self._labels(key)} {value}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if key not in self._values:
+                # Per bucket counts (not cumulative), sum, count
+                self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state = self._values[key]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, key, value):
+        counts, total, count = value
+        samples, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            samples.append(
+                f"{self.name}_bucket{self._labels(key, le=repr(bound))} {cumulative}"
+            )
+        samples.append(f'{self.name}_bucket{self._labels(key, le="+Inf")} {count}')
+        samples.append(f"{self.name}_sum{self._labels(key)} {total}")
+        samples.append(f"{self.name}_count{self._labels(key)} {count}")
+        return samples
+
+
+STAGE_SECONDS = Histogram(
+    "image_api_stage_seconds",
+    "Time spent in each stage of request processing.",
+    labelnames=("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "image_api_request_seconds",
+    "Time to produce the response headers, per route.",
+    labelnames=("method", "route"),
+)
+REQUESTS = Counter(
+    "image_api_requests_total",
+    "Requests handled, per route and status code.",
+    labelnames=("method", "route", "status"),
+)
+BEDROCK_THROTTLES = Counter(
+    "image_api_bedrock_throttles_total",
+    "Bedrock calls rejected with a throttling error.",
+    labelnames=("model",),
+)
+BEDROCK_RETRIES = Counter(
+    "image_api_bedrock_retries_total",
+    "Bedrock calls retried after a throttling or transient error.",
+    labelnames=("model",),
+)
+
+BEDROCK_QUEUED = Gauge(
+    "image_api_bedrock_queued",
+    "Bedrock calls waiting for a concurrency slot or rate limit quota.",
+    labelnames=("model",),
+)
+BEDROCK_IN_FLIGHT = Gauge(
+    "image_api_bedrock_in_flight",
+    "Bedrock calls currently running.",
+    labelnames=("model",),
+)
+BEDROCK_BUCKET_TOKENS = Gauge(
+    "image_api_bedrock_bucket_tokens",
+    "Tokens left in each rate limit bucket (bucket is requests or tokens).",
+    labelnames=("model", "bucket"),
+)
+BEDROCK_BUCKET_RATE = Gauge(
+    "image_api_bedrock_bucket_rate_per_minute",
+    "Effective refill rate of each rate limit bucket, lowered by throttles.",
+    labelnames=("model", "bucket"),
+)
+
+HTTP_POOL_SIZE = Gauge(
+    "image_api_http_pool_size",
+    "Pooled connections per host of each AWS client.",
+    labelnames=("client",),
+)
+HTTP_POOL_IN_USE = Gauge(
+    "image_api_http_pool_in_use",
+    "HTTP requests an AWS client is currently sending or awaiting.",
+    labelnames=("client",),
+)
+HTTP_POOL_SATURATED = Counter(
+    "image_api_http_pool_saturated_total",
+    "Requests sent while every pooled connection was busy; each opens an "
+    "extra connection that is discarded afterwards.",
+    labelnames=("client",),
+)
+
+METRICS = [
+    STAGE_SECONDS,
+    REQUEST_SECONDS,
+    REQUESTS,
+    BEDROCK_THROTTLES,
+    BEDROCK_RETRIES,
+    BEDROCK_QUEUED,
+    BEDROCK_IN_FLIGHT,
+    BEDROCK_BUCKET_TOKENS,
+    BEDROCK_BUCKET_RATE,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_IN_USE,
+    HTTP_POOL_SATURATED,
+]
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage):
+    """Time the block as ``stage``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def start_request():
+    """
+    Start collecting the stage timings of the current request.
+
+    Returns:
+        list: The ``(stage, seconds)`` pairs recorded so far, filled in place.
+    """
+    timings = []
+    _request_timings.set(timings)
+    _request_started.set(time.perf_counter())
+    return timings
+
+
+def observe_since_request(stage):
+    """Record the time from the start of the current request as ``stage``."""
+    started = _request_started.get()
+    if started is not None:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def server_timing(timings, total):
+    """Format collected timings as a ``Server-Timing`` header value."""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def add_collector(collect):
+    """Call ``collect()`` before every render, to refresh sampled gauges."""
+    _collectors.append(collect)
+
+
+def render():
+    """Render every metric in the Prometheus text exposition format."""
+    for collect in _collectors:
+        collect()
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,151 @@
+import asyncio
+import json
+from app.core.cache import canonical_key
+from app.core.metrics import timed
+from app.core.prompt import GenerateImagePrePrompt, SearchPrePrompt
+
+TEXT_MODEL_ID = "amazon.nova-pro-v1:0"
+
+# Configure the inference parameters.
+INFERENCE_PARAMS = {"maxTokens": 500, "topP": 0.9, "topK": 20, "temperature": 0.7}
+
+GENERATE_SYSTEM = [
+    {
+        "text": "Yor are an assistant to user improve prompt, which is used to input a image generation AI model, so you need to make sure the prompt is clear and easy to understand by AI model."
+    },
+    {
+        "text": "For helping you comprehensive understand the prompt, you could assume that input vocabularies are all about a computer. For example, the case could refer to computer case, the cooler could refer to computer cooler."
+    },
+    {
+        "text": "Your output should be directly used as the input of image generation AI model, so you don't need to add any extra information."
+    },
+]
+
+SEARCH_SYSTEM = [{"text": "MAKE SURE YOUR RESPONSE SHOULD UNDER 800 tokens."}]
+
+SEARCH_MAX_CHARS = 800
+
+
+class SearchTextCleaner:
+    """
+    Apply the search prompt cleanup (drop newlines, backslashes and ``---``,
+    cap at ``SEARCH_MAX_CHARS``) to streamed text, delta by delta.
+
+    Trailing dashes are held back until the next delta shows whether they
+    start a ``---``, so the streamed output matches the buffered one.
+    """
+
+    def __init__(self, max_chars=SEARCH_MAX_CHARS):
+        self.max_chars = max_chars
+        self.emitted = 0
+        self.pending = ""
+
+    def feed(self, delta):
+        text = self.pending + delta.replace("\n", "").replace("\\", "")
+        text = text.replace("---", "")
+        held = len(text) - len(text.rstrip("-"))
+        held = min(held, 2)
+        self.pending = text[len(text) - held :] if held else ""
+        return self._limit(text[: len(text) - held])
+
+    def flush(self):
+        text, self.pending = self.pending, ""
+        return self._limit(text)
+
+    def _limit(self, text):
+        text = text[: max(self.max_chars - self.emitted, 0)]
+        self.emitted += len(text)
+        return text
+
+
+def normalize_prompt(prompt):
+    """Lower-case the prompt and collapse whitespace, for cache keys."""
+    return " ".join(prompt.lower().split())
+
+
+class PromptOptimizer:
+    """
+    Rewrite user prompts with Nova Pro, either buffered or streamed.
+
+    ``kind`` is ``"generate"`` (prompts for image generation) or
+    ``"search"`` (queries for the product knowledge base, cleaned up and
+    capped at ``SEARCH_MAX_CHARS``).
+
+    With a ``PromptCache``, results are memoized on the normalized prompt plus
+    everything else sent to the model, so recurring queries skip the LLM call.
+    """
+
+    def __init__(self, invoker, model_id=TEXT_MODEL_ID, cache=None):
+        self.invoker = invoker
+        self.model_id = model_id
+        self.cache = cache
+
+    def cache_key(self, kind, prompt):
+        request_body = self.build_request(kind, normalize_prompt(prompt))
+        return canonical_key(self.model_id, kind, request_body)
+
+    def build_request(self, kind, prompt):
+        if kind == "generate":
+            pre_prompt, system_list = GenerateImagePrePrompt, GENERATE_SYSTEM
+        elif kind == "search":
+            pre_prompt, system_list = SearchPrePrompt, SEARCH_SYSTEM
+        else:
+            raise ValueError(f"Unknown prompt kind '{kind}'")
+
+        # Define one or more messages using the "user" and "assistant" roles.
+        message_list = [
+            {"role": "user", "content": [{"text": f"{pre_prompt} {prompt}"}]}
+        ]
+        return {
+            "schemaVersion": "messages-v1",
+            "messages": message_list,
+            "system": system_list,
+            "inferenceConfig": INFERENCE_PARAMS,
+        }
+
+    async def stream(self, kind, prompt):
+        """
+        Yield the optimized prompt text as the model produces it.
+
+        Args:
+            kind (str): ``"generate"`` or ``"search"``.
+            prompt (str): The user prompt.
+
+        Yields:
+            str: Cleaned text deltas, possibly empty.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache_key(kind, prompt)
+            # The cache may have a disk tier, keep its I/O off the event loop
+            text = await asyncio.to_thread(self.cache.get, cache_key)
+            if text is not None:
+                yield text
+                return
+
+        body = json.dumps(self.build_request(kind, prompt))
+        cleaner = SearchTextCleaner() if kind == "search" else None
+        chunks = []
+        async for delta in self.invoker.stream_text(body, self.model_id):
+            chunks.append(cleaner.feed(delta) if cleaner else delta)
+            yield chunks[-1]
+        if cleaner:
+            chunks.append(cleaner.flush())
+            yield chunks[-1]
+        if cache_key is not None:
+            # Only complete responses are cached
+            await asyncio.to_thread(self.cache.set, cache_key, "".join(chunks))
+
+    async def optimize(self, kind, prompt):
+        """
+        Return the full optimized prompt.
+
+        Args:
+            kind (str): ``"generate"`` or ``"search"``.
+            prompt (str): The user prompt.
+
+        Returns:
+            str: The optimized prompt.
+        """
+        with timed("prompt_optimize"):
+            return "".join([text async for text in self.stream(kind, prompt)])
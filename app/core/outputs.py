@@ -0,0 +1,197 @@
+import asyncio
+import mimetypes
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.core.clients import LazyClient, _env_flag, _env_number
+
+MiB = 1024 * 1024
+
+
+class LocalOutputStore:
+    """
+    Keep generated images in the local output directory. Object keys are
+    the filenames, served by ``/images/{filename}``.
+    """
+
+    remote = False
+
+    def key(self, image_path):
+        return os.path.basename(image_path)
+
+    def upload(self, image_path):
+        pass
+
+    async def wait(self, key):
+        pass
+
+    def url(self, key):
+        return None
+
+    def stats(self):
+        return {"backend": "local"}
+
+
+class S3OutputStore:
+    """
+    Upload generated images to an S3 bucket (or any S3-compatible endpoint
+    such as MinIO) in the background.
+
+    Uploads run on their own thread pool; images above
+    ``multipart_threshold`` are sent as concurrent multipart uploads. The
+    local file is removed once uploaded unless ``keep_local`` is set.
+
+    Args:
+        s3_client: The boto3 S3 client.
+        bucket (str): Destination bucket.
+        prefix (str): Prefix of the object keys.
+        keep_local (bool): Keep the local copy after the upload.
+        workers (int): Images uploaded at the same time.
+        multipart_threshold (int): Size in bytes from which uploads are multipart.
+        multipart_concurrency (int): Parts of one image uploaded at the same time.
+        url_expiry (int): Seconds the presigned download URLs are valid.
+    """
+
+    remote = True
+
+    def __init__(
+        self,
+        s3_client,
+        bucket,
+        prefix="",
+        keep_local=False,
+        workers=8,
+        multipart_threshold=8 * MiB,
+        multipart_concurrency=4,
+        url_expiry=3600,
+    ):
+        from boto3.s3.transfer import TransferConfig
+
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.keep_local = keep_local
+        self.url_expiry = url_expiry
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=max(multipart_threshold, 5 * MiB),
+            max_concurrency=multipart_concurrency,
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="upload"
+        )
+        self.uploaded = 0
+        self.failed = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def key(self, image_path):
+        return f"{self.prefix}{os.path.basename(image_path)}"
+
+    def _upload(self, image_path, key):
+        content_type = mimetypes.guess_type(image_path)[0]
+        self.s3_client.upload_file(
+            image_path,
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": content_type} if content_type else None,
+            Config=self.transfer_config,
+        )
+        if not self.keep_local:
+            os.remove(image_path)
+
+    def upload(self, image_path):
+        """
+        Start uploading a written image and return right away. Safe to call
+        from any thread.
+        """
+        key = self.key(image_path)
+        future = self.executor.submit(self._upload, image_path, key)
+        with self._lock:
+            self._pending[key] = future
+        future.add_done_callback(lambda done: self._uploaded(key, done))
+
+    def _uploaded(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+            if future.exception() is None:
+                self.uploaded += 1
+            else:
+                self.failed += 1
+        if future.exception() is not None:
+            print(f"Error uploading {key}: {future.exception()}")
+
+    async def wait(self, key):
+        """Wait for a pending upload of ``key``, if any."""
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            await asyncio.wait({asyncio.wrap_future(future)})
+
+    def url(self, key):
+        return self.s3_client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=self.url_expiry,
+        )
+
+    def stats(self):
+        return {
+            "backend": "s3",
+            "bucket": self.bucket,
+            "pending": len(self._pending),
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+        }
+
+
+def create_output_store(s3_client):
+    """
+    Build the output store from environment settings.
+
+    ``OUTPUT_STORAGE=s3`` uploads to ``OUTPUT_S3_BUCKET``. With
+    ``OUTPUT_S3_ENDPOINT_URL`` set, a dedicated client talks to that
+    endpoint instead, e.g. a local MinIO server.
+
+    Args:
+        s3_client: The shared boto3 S3 client.
+
+    Returns:
+        LocalOutputStore or S3OutputStore: The output store.
+    """
+    backend = os.environ.get("OUTPUT_STORAGE", "local").lower()
+    if backend == "local":
+        return LocalOutputStore()
+    if backend != "s3":
+        raise ValueError(f"Unknown OUTPUT_STORAGE '{backend}'")
+    bucket = os.environ.get("OUTPUT_S3_BUCKET")
+    if not bucket:
+        raise ValueError("OUTPUT_S3_BUCKET is required with OUTPUT_STORAGE=s3")
+    workers = _env_number("OUTPUT_UPLOAD_WORKERS", 8, int)
+    multipart_concurrency = _env_number("OUTPUT_MULTIPART_CONCURRENCY", 4, int)
+    endpoint_url = os.environ.get("OUTPUT_S3_ENDPOINT_URL")
+    if endpoint_url:
+        s3_client = LazyClient(
+            "s3",
+            name="output-s3",
+            endpoint_url=endpoint_url,
+            region_name=os.environ.get("OUTPUT_S3_REGION", "us-east-1"),
+            # Unset keys fall back to the default credential chain
+            aws_access_key_id=os.environ.get("OUTPUT_S3_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.environ.get("OUTPUT_S3_SECRET_ACCESS_KEY"),
+            config=dict(
+                s3={"addressing_style": "path"},
+                max_pool_connections=workers * multipart_concurrency,
+            ),
+        )
+    return S3OutputStore(
+        s3_client,
+        bucket,
+        prefix=os.environ.get("OUTPUT_S3_PREFIX", "generated/"),
+        keep_local=_env_flag("OUTPUT_KEEP_LOCAL", False),
+        workers=workers,
+        multipart_threshold=_env_number("OUTPUT_MULTIPART_THRESHOLD", 8 * MiB, int),
+        multipart_concurrency=multipart_concurrency,
+        url_expiry=_env_number("OUTPUT_URL_EXPIRY", 3600, int),
+    )
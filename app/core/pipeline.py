@@ -0,0 +1,303 @@
+import asyncio
+import json
+import os
+import random
+import uuid
+from app.core.cache import canonical_key
+from app.core.metrics import timed
+from app.core.preprocess import InputPreprocessor
+from app.models import ResponseModeEnum, TaskTypeEnum
+from app.core.writer import ImageWriter
+from app.utils import IMAGE_FORMATS
+
+
+class GenerationTask:
+    """
+    Describe how a request model for one ``TaskTypeEnum`` maps onto a
+    Bedrock request body.
+
+    Args:
+        task_type (TaskTypeEnum): The Bedrock task type.
+        params_field (str): Attribute of the request model holding the params.
+        params_key (str): Key of the params in the Bedrock body. Defaults to
+            ``params_field``.
+        file_prefix (str): Prefix of the saved image filenames.
+        prompt_prefix (str): Text prepended to ``params.text``, if any.
+        uses_config (bool): Whether the task sends ``imageGenerationConfig``.
+    """
+
+    def __init__(
+        self,
+        task_type,
+        params_field,
+        params_key=None,
+        file_prefix=None,
+        prompt_prefix=None,
+        uses_config=True,
+    ):
+        self.task_type = task_type
+        self.params_field = params_field
+        self.params_key = params_key or params_field
+        self.file_prefix = file_prefix or task_type.value.lower()
+        self.prompt_prefix = prompt_prefix
+        self.uses_config = uses_config
+
+
+class GenerationContext:
+    """State carried through the pipeline stages for a single request."""
+
+    def __init__(self, task, request, response_mode=ResponseModeEnum.both):
+        self.task = task
+        self.request = request
+        self.response_mode = response_mode
+        self.body = None
+        self.seed = None
+        self.request_key = None
+        self.cache_key = None
+        self.response_body = None
+        self.images = []
+        self.image_paths = []
+
+
+class ImageGenerationPipeline:
+    """
+    Run every image task through the same stages:
+
+    ``preprocess`` -> ``build_request`` -> ``invoke`` -> ``parse_response`` ->
+    ``persist`` -> ``respond``
+
+    Each stage is a method taking the ``GenerationContext``, so a stage can be
+    replaced by subclassing, and a new task type only needs ``register``.
+    """
+
+    def __init__(
+        self,
+        invoker,
+        image_model,
+        output_dir,
+        cache=None,
+        output_format="png",
+        thumbnail_size=None,
+        single_flight=None,
+        writer=None,
+        preprocessor=None,
+    ):
+        if output_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported output format '{output_format}'")
+        self.invoker = invoker
+        self.image_model = image_model
+        self.output_dir = output_dir
+        self.cache = cache
+        self.output_format = output_format
+        self.thumbnail_size = thumbnail_size
+        self.single_flight = single_flight
+        self.writer = writer or ImageWriter(
+            output_format=output_format, thumbnail_size=thumbnail_size
+        )
+        self.preprocessor = preprocessor or InputPreprocessor()
+        self.tasks = {}
+
+    def register(self, task):
+        self.tasks[task.task_type] = task
+        return task
+
+    async def run(self, task_type, request, response_mode=ResponseModeEnum.both):
+        """
+        Run a request through all stages.
+
+        Args:
+            task_type (TaskTypeEnum): The registered task type.
+            request (BaseModel): The validated request model.
+            response_mode (ResponseModeEnum): Whether to inline the images,
+                only reference the saved files, or both.
+
+        Returns:
+            dict: The ``ImageResponse`` payload.
+        """
+        ctx = GenerationContext(self.tasks[task_type], request, response_mode)
+        with timed("preprocess"):
+            await self.preprocess(ctx)
+        with timed("build_request"):
+            self.build_request(ctx)
+        await self.invoke(ctx)
+        with timed("parse_response"):
+            self.parse_response(ctx)
+        with timed("persist"):
+            await self.persist(ctx)
+        return self.respond(ctx)
+
+    async def preprocess(self, ctx):
+        # Bad inputs fail here instead of after a Bedrock round trip
+        await self.preprocessor.run(getattr(ctx.request, ctx.task.params_field))
+
+    def build_request(self, ctx):
+        task = ctx.task
+        params = getattr(ctx.request, task.params_field)
+        if task.prompt_prefix:
+            params.text = f"{task.prompt_prefix} {params.text}"
+        ctx.body = {
+            "taskType": task.task_type,
+            task.params_key: params.dict(exclude_none=True),
+        }
+        seeded = True
+        if task.uses_config:
+            config = ctx.request.imageGenerationConfig
+            ctx.body["imageGenerationConfig"] = config.dict(exclude_none=True)
+        # Identifies identical requests, before any server-drawn seed
+        ctx.request_key = canonical_key(
+            self.image_model,
+            task.task_type,
+            ctx.body[task.params_key],
+            ctx.body.get("imageGenerationConfig"),
+        )
+        if task.uses_config:
+            # Respect the caller's seed, only draw one when it is absent
+            seeded = config.seed is not None
+            if not seeded:
+                config.seed = random.randint(1, 1000000)
+                ctx.body["imageGenerationConfig"]["seed"] = config.seed
+            ctx.seed = config.seed
+        if seeded:
+            # Output is deterministic for a caller-chosen seed (or no seed at all)
+            ctx.cache_key = ctx.request_key
+
+    async def invoke(self, ctx):
+        if self.single_flight is None:
+            ctx.response_body, ctx.seed = await self._invoke(ctx)
+            return
+        # Identical concurrent requests share one call, and its seed
+        ctx.response_body, ctx.seed = await self.single_flight.do(
+            ctx.request_key, lambda: self._invoke(ctx)
+        )
+
+    async def _invoke(self, ctx):
+        if self.cache is not None and ctx.cache_key is not None:
+            images = await asyncio.to_thread(self.cache.get, ctx.cache_key)
+            if images is not None:
+                return {"images": images}, ctx.seed
+        response_body = await self.invoker.invoke_model(
+            json.dumps(ctx.body), self.image_model
+        )
+        if self.cache is not None and ctx.cache_key is not None:
+            images = response_body.get("images")
+            if images:
+                await asyncio.to_thread(self.cache.set, ctx.cache_key, images)
+        return response_body, ctx.seed
+
+    def parse_response(self, ctx):
+        ctx.images = ctx.response_body.get("images", [])
+
+    async def persist(self, ctx):
+        _, extension = IMAGE_FORMATS[self.output_format]
+        # Filenames double as object keys in a bucket shared across replicas,
+        # so they must not collide
+        name = uuid.uuid4().hex
+        for i in range(len(ctx.images)):
+            image_path = (
+                f"{self.output_dir}/{ctx.task.file_prefix}_{name}_{i}.{extension}"
+            )
+            ctx.image_paths.append(image_path)
+        # All images are written at once on the writer's pool
+        await self.writer.write(ctx.images, ctx.image_paths)
+
+    def respond(self, ctx):
+        response = {
+            "image_paths": ctx.image_paths,
+            "object_keys": [self.writer.store.key(path) for path in ctx.image_paths],
+            "seed": ctx.seed,
+        }
+        if ctx.response_mode != ResponseModeEnum.inline:
+            response["image_urls"] = [
+                f"/images/{os.path.basename(path)}" for path in ctx.image_paths
+            ]
+        if ctx.response_mode != ResponseModeEnum.reference:
+            response["base64_images"] = ctx.images
+        return response
+
+
+def create_pipeline(
+    invoker,
+    image_model,
+    output_dir,
+    prompt_prefix=None,
+    cache=None,
+    output_format="png",
+    thumbnail_size=None,
+    single_flight=None,
+    writer=None,
+    preprocessor=None,
+):
+    """
+    Build the pipeline with every supported Nova Canvas task registered.
+
+    Args:
+        invoker (BedrockInvoker): The shared Bedrock invoker.
+        image_model (str): The image generation model ID.
+        output_dir (str): Directory generated images are written to.
+        prompt_prefix (str): Domain hint prepended to generation prompts.
+        cache (ResultCache): Optional cache of deterministic results.
+        output_format (str): Format saved images are transcoded to, ``png``
+            keeps the model output untouched.
+        thumbnail_size (int): Optional bound of the saved images' longest side.
+        single_flight (SingleFlight): Optional coalescer of identical requests.
+        writer (ImageWriter): Optional image writer, by default one writing
+            in ``output_format`` before responding.
+        preprocessor (InputPreprocessor): Optional input image checks, by
+            default rejecting inputs above the model limits.
+
+    Returns:
+        ImageGenerationPipeline: The configured pipeline.
+    """
+    pipeline = ImageGenerationPipeline(
+        invoker,
+        image_model,
+        output_dir,
+        cache,
+        output_format,
+        thumbnail_size,
+        single_flight,
+        writer,
+        preprocessor,
+    )
+    pipeline.register(
+        GenerationTask(
+            TaskTypeEnum.TEXT_IMAGE,
+            "textImageParams",
+            params_key="textToImageParams",
+            file_prefix="text-to-image",
+            prompt_prefix=prompt_prefix,
+        )
+    )
+    pipeline.register(
+        GenerationTask(
+            TaskTypeEnum.INPAINTING,
+            "inPaintingParams",
+            file_prefix="inpainting",
+            prompt_prefix=prompt_prefix,
+        )
+    )
+    pipeline.register(
+        GenerationTask(
+            TaskTypeEnum.OUTPAINTING,
+            "outPaintingParams",
+            file_prefix="outpainting",
+            prompt_prefix=prompt_prefix,
+        )
+    )
+    pipeline.register(
+        GenerationTask(
+            TaskTypeEnum.IMAGE_VARIATION,
+            "imageVariationParams",
+            file_prefix="variation",
+            prompt_prefix=prompt_prefix,
+        )
+    )
+    pipeline.register(
+        GenerationTask(
+            TaskTypeEnum.BACKGROUND_REMOVAL,
+            "backgroundRemovalParams",
+            file_prefix="remove-bg",
+            uses_config=False,
+        )
+    )
+    return pipeline
@@ -0,0 +1,237 @@
+import asyncio
+import base64
+import binascii
+import io
+from concurrent.futures import ThreadPoolExecutor
+from app.core.clients import _env_flag, _env_number
+
+# Nova Canvas input limits
+MAX_INPUT_PIXELS = 4_194_304
+MAX_INPUT_SIDE = 4096
+MIN_INPUT_SIDE = 320
+INPUT_FORMATS = ("PNG", "JPEG")
+# Decoded bytes read to find an image's format and size
+HEADER_BYTES = 64 * 1024
+
+# Params fields holding base64 input images, and the mask paired with "image"
+IMAGE_FIELDS = ("image", "conditionImage", "images")
+MASK_FIELD = "maskImage"
+
+
+class InvalidImageError(ValueError):
+    """An input image the model would reject."""
+
+
+def decode_image(field, base64_image, max_bytes=None):
+    """Decode ``base64_image``, or only its first ``max_bytes`` bytes."""
+    if max_bytes is not None:
+        # 4 base64 characters encode 3 bytes
+        base64_image = base64_image[: (max_bytes + 2) // 3 * 4]
+    try:
+        return base64.b64decode(base64_image, validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidImageError(f"{field} is not valid base64")
+
+
+def _open_header(image_bytes):
+    from PIL import Image
+
+    # Image.open only parses the header, the pixels load lazily
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return image.format, image.size
+
+
+def read_image_header(field, base64_image):
+    """
+    Read the format and size of a base64 image without decoding its pixels.
+
+    Only the first ``HEADER_BYTES`` are decoded, which hold the header of
+    any PNG or JPEG short of unusually large metadata; the whole image is
+    decoded only in that case.
+
+    Returns:
+        tuple: ``(format, width, height)``.
+
+    Raises:
+        InvalidImageError: When the data is not a PNG or JPEG image.
+    """
+    from PIL import UnidentifiedImageError
+
+    head = decode_image(field, base64_image, HEADER_BYTES)
+    try:
+        image_format, (width, height) = _open_header(head)
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        if len(head) < HEADER_BYTES:
+            raise InvalidImageError(f"{field} is not a readable image")
+        try:
+            image_format, (width, height) = _open_header(
+                decode_image(field, base64_image)
+            )
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            raise InvalidImageError(f"{field} is not a readable image")
+    if image_format not in INPUT_FORMATS:
+        raise InvalidImageError(
+            f"{field} must be PNG or JPEG, got {image_format or 'unknown'}"
+        )
+    return image_format, width, height
+
+
+def fit_size(width, height, max_pixels, max_side):
+    """The largest size with the same aspect ratio within both limits."""
+    scale = min(
+        1.0, max_side / max(width, height), (max_pixels / (width * height)) ** 0.5
+    )
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+def resize_image(field, base64_image, size, image_format, mask=False):
+    from PIL import Image
+
+    image_bytes = decode_image(field, base64_image)
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # Masks are black and white, interpolation would add grey edges
+        resample = Image.NEAREST if mask else Image.LANCZOS
+        resized = image.resize(size, resample)
+        buffer = io.BytesIO()
+        if image_format == "JPEG":
+            resized.convert("RGB").save(buffer, format="JPEG", quality=90)
+        else:
+            resized.save(buffer, format="PNG", optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class InputPreprocessor:
+    """
+    Check input images locally before they are sent to Bedrock.
+
+    Only the image headers are parsed: the format must be PNG or JPEG, the
+    size within ``max_pixels`` and ``max_side`` and at least ``min_side``
+    on both sides, and a ``maskImage`` must match its ``image`` exactly.
+    Oversized inputs are rejected, or with ``downscale`` decoded and resized
+    to the largest size the model accepts (masks along with their image).
+    Undersized inputs are always rejected.
+
+    The work runs on a small thread pool, off the event loop.
+
+    Args:
+        max_pixels (int): Largest accepted pixel count.
+        max_side (int): Largest accepted width or height.
+        min_side (int): Smallest accepted width or height.
+        downscale (bool): Resize oversized inputs instead of rejecting them.
+        workers (int): Threads preprocessing requests.
+    """
+
+    def __init__(
+        self,
+        max_pixels=MAX_INPUT_PIXELS,
+        max_side=MAX_INPUT_SIDE,
+        min_side=MIN_INPUT_SIDE,
+        downscale=False,
+        workers=4,
+    ):
+        self.max_pixels = max_pixels
+        self.max_side = max_side
+        self.min_side = min_side
+        self.downscale = downscale
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="preprocess"
+        )
+        self.downscaled = 0
+        self.rejected = 0
+
+    async def run(self, params):
+        """Run ``process`` on the preprocessing pool."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.process, params)
+
+    def process(self, params):
+        """
+        Validate, and possibly downscale, the input images of ``params`` in place.
+
+        Raises:
+            InvalidImageError: When an input image would be rejected.
+        """
+        try:
+            self._process(params)
+        except InvalidImageError:
+            self.rejected += 1
+            raise
+
+    def _process(self, params):
+        sizes = {}
+        for field in IMAGE_FIELDS:
+            value = getattr(params, field, None)
+            if not value:
+                continue
+            if isinstance(value, list):
+                setattr(
+                    params,
+                    field,
+                    [
+                        self._image(f"{field}[{i}]", image)[0]
+                        for i, image in enumerate(value)
+                    ],
+                )
+            else:
+                image, sizes[field] = self._image(field, value)
+                setattr(params, field, image)
+
+        mask = getattr(params, MASK_FIELD, None)
+        if mask and "image" in sizes:
+            original, target = sizes["image"]
+            mask_format, width, height = read_image_header(MASK_FIELD, mask)
+            if (width, height) != original:
+                raise InvalidImageError(
+                    f"maskImage is {width}x{height} but image is "
+                    f"{original[0]}x{original[1]}, they must match"
+                )
+            if target != original:
+                setattr(
+                    params,
+                    MASK_FIELD,
+                    resize_image(MASK_FIELD, mask, target, mask_format, mask=True),
+                )
+
+    def _image(self, field, base64_image):
+        """Return the image to send and its ``(original, sent)`` sizes."""
+        image_format, width, height = read_image_header(field, base64_image)
+        if min(width, height) < self.min_side:
+            raise InvalidImageError(
+                f"{field} is {width}x{height}, inputs must be at least "
+                f"{self.min_side} pixels per side"
+            )
+        target = fit_size(width, height, self.max_pixels, self.max_side)
+        if target == (width, height):
+            return base64_image, ((width, height), target)
+        # Very elongated images would end up below min_side when downscaled
+        if not self.downscale or min(target) < self.min_side:
+            raise InvalidImageError(
+                f"{field} is {width}x{height}, inputs are limited to "
+                f"{self.max_side} pixels per side and {self.max_pixels} pixels"
+            )
+        self.downscaled += 1
+        resized = resize_image(field, base64_image, target, image_format)
+        return resized, ((width, height), target)
+
+    def stats(self):
+        return {
+            "downscale": self.downscale,
+            "downscaled": self.downscaled,
+            "rejected": self.rejected,
+        }
+
+
+def create_input_preprocessor():
+    """
+    Build the input preprocessor from environment settings.
+
+    Returns:
+        InputPreprocessor: The input preprocessor.
+    """
+    return InputPreprocessor(
+        max_pixels=_env_number("INPUT_MAX_PIXELS", MAX_INPUT_PIXELS, int),
+        max_side=_env_number("INPUT_MAX_SIDE", MAX_INPUT_SIDE, int),
+        min_side=_env_number("INPUT_MIN_SIDE", MIN_INPUT_SIDE, int),
+        downscale=_env_flag("INPUT_DOWNSCALE", False),
+        workers=_env_number("INPUT_PREPROCESS_WORKERS", 4, int),
+    )
@@ -0,0 +1,226 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from botocore.exceptions import ClientError
+from app.core.cache import DiskCache, LRUCache
+from app.core.clients import _env_number
+
+
+class CacheEntry:
+    """A cached value with the validators needed to revalidate it."""
+
+    def __init__(self, value, size, etag=None, last_modified=None, ttl=0):
+        self.value = value
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = time.monotonic() + ttl
+
+    @property
+    def fresh(self):
+        return time.monotonic() < self.expires_at
+
+
+class ProductImageCache:
+    """
+    Cache of the product catalogue behind ``get_images``.
+
+    * Product JSON objects from S3 are kept in memory.
+    * Product images are kept in memory as data URIs, and their raw bytes on
+      disk keyed by URL.
+
+    Fresh entries (younger than ``ttl`` seconds) are served without any
+    network call. Stale entries are revalidated with ``If-None-Match`` /
+    ``If-Modified-Since``, so an unchanged image or object is not downloaded
+    again.
+
+    Args:
+        directory (str): Where raw image bytes are stored.
+        ttl (float): Seconds an entry is served without revalidation.
+        max_entries (int): Capacity of each in-memory tier.
+        max_disk_bytes (int): Capacity of the on-disk tier, 0 disables it.
+    """
+
+    def __init__(
+        self, directory, ttl=3600, max_entries=512, max_disk_bytes=512 * 1024**2
+    ):
+        self.ttl = ttl
+        self.objects = LRUCache(max_entries)
+        self.images = LRUCache(max_entries)
+        self.disk = DiskCache(directory, max_disk_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit, size=0, revalidated=False):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.bytes_saved += size
+            else:
+                self.misses += 1
+            if revalidated:
+                self.revalidated += 1
+
+    def get_object(self, s3, bucket_name, object_key):
+        """
+        Fetch and parse a product JSON object, served from memory when fresh.
+
+        Args:
+            s3: The boto3 S3 client.
+            bucket_name (str): The name of the S3 bucket.
+            object_key (str): The key of the object in the S3 bucket.
+
+        Returns:
+            The parsed JSON content.
+        """
+        cache_key = f"{bucket_name}/{object_key}"
+        entry = self.objects.get(cache_key)
+        if entry is not None and entry.fresh:
+            self._count(True, entry.size)
+            return entry.value
+
+        kwargs = {"Bucket": bucket_name, "Key": object_key}
+        if entry is not None and entry.etag:
+            kwargs["IfNoneMatch"] = entry.etag
+        try:
+            response = s3.get_object(**kwargs)
+        except ClientError as e:
+            if entry is None or e.response["Error"]["Code"] not in (
+                "304",
+                "NotModified",
+            ):
+                raise
+            self.objects.set(
+                cache_key, CacheEntry(entry.value, entry.size, entry.etag, ttl=self.ttl)
+            )
+            self._count(True, entry.size, revalidated=True)
+            return entry.value
+
+        body = response["Body"].read()
+        product_data = json.loads(body)
+        self.objects.set(
+            cache_key,
+            CacheEntry(product_data, len(body), response.get("ETag"), ttl=self.ttl),
+        )
+        self._count(False)
+        return product_data
+
+    def _load_from_disk(self, url):
+        data = self.disk.get(_url_key(url))
+        if data is None:
+            return None
+        header, _, content = data.partition(b"\n")
+        meta = json.loads(header)
+        # Entries restored from disk are stale until revalidated
+        return CacheEntry(
+            _data_uri(meta["content_type"], content),
+            len(content),
+            meta.get("etag"),
+            meta.get("last_modified"),
+        )
+
+    def fetch_image(self, session, url, timeout=None):
+        """
+        Return a product image as a data URI, downloading it only when it is
+        missing or has changed.
+
+        Args:
+            session (requests.Session): The pooled HTTP session.
+            url (str): The image URL.
+            timeout: Passed to ``session.get``.
+
+        Returns:
+            str: The image as a ``data:`` URI.
+        """
+        entry = self.images.get(url)
+        if entry is None:
+            entry = self._load_from_disk(url)
+        elif entry.fresh:
+            self._count(True, entry.size)
+            return entry.value
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            entry.expires_at = time.monotonic() + self.ttl
+            self.images.set(url, entry)
+            self._count(True, entry.size, revalidated=True)
+            return entry.value
+        response.raise_for_status()  # Raise exception if download failed
+
+        content = response.content
+        content_type = response.headers.get("Content-Type", "application/octet-stream")
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        entry = CacheEntry(
+            _data_uri(content_type, content),
+            len(content),
+            etag,
+            last_modified,
+            self.ttl,
+        )
+        self.images.set(url, entry)
+        if etag or last_modified:
+            meta = {
+                "content_type": content_type,
+                "etag": etag,
+                "last_modified": last_modified,
+            }
+            self.disk.set(
+                _url_key(url), json.dumps(meta).encode("utf-8") + b"\n" + content
+            )
+        self._count(False)
+        return entry.value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "memory_objects": len(self.objects),
+            "memory_images": len(self.images),
+            "disk_bytes": self.disk.size,
+        }
+
+
+def _url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _data_uri(content_type, content):
+    return f"data:{content_type};base64,{base64.b64encode(content).decode('utf-8')}"
+
+
+def create_product_cache(output_dir):
+    """
+    Build the product image cache from environment settings.
+
+    Args:
+        output_dir (str): The image output directory; raw bytes are stored
+            under ``<output_dir>/product-cache`` unless ``PRODUCT_CACHE_DIR`` is set.
+
+    Returns:
+        ProductImageCache: The configured cache.
+    """
+    return ProductImageCache(
+        os.environ.get("PRODUCT_CACHE_DIR", os.path.join(output_dir, "product-cache")),
+        ttl=_env_number("PRODUCT_CACHE_TTL", 3600, float),
+        max_entries=_env_number("PRODUCT_CACHE_ENTRIES", 512, int),
+        max_disk_bytes=_env_number(
+            "PRODUCT_CACHE_DISK_BYTES", 512 * 1024**2, int, allow_zero=True
+        ),
+    )
@@ -0,0 +1,281 @@
+"""
+In-process alternative to the Bedrock knowledge base retrieval.
+
+Build the index offline, then point ``LOCAL_INDEX_PATH`` at it and set
+``RETRIEVAL_BACKEND=local``::
+
+    python -m app.core.retrieval build --output product-index.npz
+    python -m app.core.retrieval compare --index product-index.npz --queries queries.txt
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+from app.core.storage import PRODUCT_BUCKET
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+# Product text sent to the embedding model is capped at this many characters
+EMBEDDING_MAX_CHARS = 20000
+
+
+class LocalVectorIndex:
+    """
+    Product embeddings held in one normalized NumPy matrix, searched with a
+    single matrix-vector product.
+
+    Args:
+        embeddings (np.ndarray): ``(n, dim)`` embedding matrix.
+        uris (list): S3 URI of the product behind each row.
+        model_id (str): The embedding model the index was built with, None
+            if unknown (indexes saved before it was recorded).
+    """
+
+    def __init__(self, embeddings, uris, model_id=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.embeddings = embeddings / np.maximum(norms, 1e-12)
+        self.uris = np.asarray(uris)
+        self.model_id = model_id
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            model_id = str(data["model_id"]) if "model_id" in data else None
+            return cls(data["embeddings"], data["uris"], model_id)
+
+    def save(self, path):
+        extra = {} if self.model_id is None else {"model_id": self.model_id}
+        np.savez(path, embeddings=self.embeddings, uris=self.uris, **extra)
+
+    def __len__(self):
+        return len(self.uris)
+
+    def search(self, query_vector, k=1):
+        """
+        Return the ``k`` most cosine-similar products.
+
+        Args:
+            query_vector (list): The query embedding.
+            k (int): Number of results.
+
+        Returns:
+            list: ``(uri, score)`` tuples, best first.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = self.embeddings @ query
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        # Partial sort: only the top k are ordered
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.uris[i]), float(scores[i])) for i in top]
+
+
+def embed_text_sync(bedrock_client, text, model_id=EMBEDDING_MODEL_ID):
+    response = bedrock_client.invoke_model(
+        body=json.dumps({"inputText": text[:EMBEDDING_MAX_CHARS]}),
+        modelId=model_id,
+        accept="application/json",
+        contentType="application/json",
+    )
+    return json.loads(response.get("body").read())["embedding"]
+
+
+class LocalRetriever:
+    """
+    Drop-in replacement for ``bedrock_agent.retrieve``. Only the query
+    embedding goes to Bedrock; the search itself runs in process.
+
+    Args:
+        invoker (BedrockInvoker): The shared Bedrock invoker.
+        index (LocalVectorIndex): The loaded product index.
+        model_id (str): The embedding model for queries, by default the one
+            the index was built with.
+    """
+
+    def __init__(self, invoker, index, model_id=None):
+        self.invoker = invoker
+        self.index = index
+        self.model_id = model_id or index.model_id or EMBEDDING_MODEL_ID
+
+    async def retrieve(self, query, number_of_results):
+        """
+        Search the local index.
+
+        Returns:
+            dict: A ``retrieve``-shaped response with ``retrievalResults``.
+        """
+        response_body = await self.invoker.invoke_model(
+            json.dumps({"inputText": query[:EMBEDDING_MAX_CHARS]}), self.model_id
+        )
+        matches = self.index.search(response_body["embedding"], number_of_results)
+        return {
+            "retrievalResults": [
+                {
+                    "location": {"type": "S3", "s3Location": {"uri": uri}},
+                    "score": score,
+                }
+                for uri, score in matches
+            ]
+        }
+
+
+def create_retriever(invoker):
+    """
+    Build the local retriever when ``RETRIEVAL_BACKEND=local``.
+
+    Args:
+        invoker (BedrockInvoker): The shared Bedrock invoker.
+
+    Queries are embedded with the model recorded in the index.
+    ``EMBEDDING_MODEL_ID`` is only needed for indexes that do not record
+    it, and must match when both are set.
+
+    Returns:
+        LocalRetriever: The retriever, or None to use the knowledge base.
+
+    Raises:
+        FileNotFoundError: When the index at ``LOCAL_INDEX_PATH`` is missing.
+        ValueError: When ``EMBEDDING_MODEL_ID`` differs from the index model.
+    """
+    backend = os.environ.get("RETRIEVAL_BACKEND", "remote").lower()
+    if backend == "remote":
+        return None
+    if backend != "local":
+        raise ValueError(f"Unknown RETRIEVAL_BACKEND '{backend}'")
+    path = os.environ.get("LOCAL_INDEX_PATH", "product-index.npz")
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"RETRIEVAL_BACKEND=local but the index LOCAL_INDEX_PATH={path} does "
+            f"not exist, build it with: python -m app.core.retrieval build "
+            f"--output {path}"
+        )
+    index = LocalVectorIndex.load(path)
+    model_id = os.environ.get("EMBEDDING_MODEL_ID")
+    if model_id and index.model_id and model_id != index.model_id:
+        raise ValueError(
+            f"EMBEDDING_MODEL_ID is '{model_id}' but the local index was built "
+            f"with '{index.model_id}'"
+        )
+    print(f"Loaded local product index with {len(index)} entries")
+    return LocalRetriever(invoker, index, model_id)
+
+
+def build_index(bedrock_client, s3_client, prefix="", model_id=EMBEDDING_MODEL_ID):
+    """
+    Embed every product object under ``prefix`` in the product bucket.
+
+    Returns:
+        LocalVectorIndex: The new index.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    uris, embeddings = [], []
+    for page in paginator.paginate(Bucket=PRODUCT_BUCKET, Prefix=prefix):
+        for item in page.get("Contents", []):
+            if not item["Key"].endswith(".json"):
+                continue
+            body = s3_client.get_object(Bucket=PRODUCT_BUCKET, Key=item["Key"])
+            product_data = json.loads(body["Body"].read())
+            # Image URLs carry no meaning for the embedding
+            text = json.dumps(
+                [
+                    {k: v for k, v in product.items() if k != "image_urls"}
+                    for product in product_data
+                ],
+                ensure_ascii=False,
+            )
+            embeddings.append(embed_text_sync(bedrock_client, text, model_id))
+            uris.append(f"s3://{PRODUCT_BUCKET}/{item['Key']}")
+            print(f"Embedded {item['Key']}")
+    return LocalVectorIndex(embeddings, uris, model_id)
+
+
+async def compare(config, index, queries, k, model_id=None):
+    """Print latency and recall@k of the local index against the knowledge base."""
+    from app.core.search import KNOWLEDGE_BASE_ID
+
+    invoker = config["invoker"]
+    retriever = LocalRetriever(invoker, index, model_id)
+    print(f"Embedding queries with {retriever.model_id}")
+    remote_times, local_times, recalls = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        remote = await invoker.run(
+            KNOWLEDGE_BASE_ID,
+            config["bedrock_agent_client"].retrieve,
+            knowledgeBaseId=KNOWLEDGE_BASE_ID,
+            retrievalQuery={"text": query},
+            retrievalConfiguration={
+                "vectorSearchConfiguration": {"numberOfResults": k}
+            },
+        )
+        remote_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        local = await retriever.retrieve(query, k)
+        local_times.append(time.perf_counter() - started)
+
+        def uris(response):
+            return {
+                result["location"]["s3Location"]["uri"]
+                for result in response["retrievalResults"]
+                if "s3Location" in result.get("location", {})
+            }
+
+        expected = uris(remote)
+        if expected:
+            recalls.append(len(expected & uris(local)) / len(expected))
+
+    for name, times in (("remote", remote_times), ("local", local_times)):
+        print(
+            f"{name}: p50 {np.percentile(times, 50) * 1000:.1f} ms, "
+            f"p95 {np.percentile(times, 95) * 1000:.1f} ms"
+        )
+    if recalls:
+        print(
+            f"recall@{k} vs remote: {np.mean(recalls):.3f} over {len(recalls)} queries"
+        )
+
+
+def main():
+    from dotenv import load_dotenv
+    from app.core.config import create_clients
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Embed the product bucket into an index")
+    build.add_argument("--output", default="product-index.npz")
+    build.add_argument("--prefix", default="")
+    build.add_argument("--model-id", default=EMBEDDING_MODEL_ID)
+    bench = commands.add_parser("compare", help="Benchmark the index against the KB")
+    bench.add_argument("--index", default="product-index.npz")
+    bench.add_argument("--queries", required=True, help="File with one query per line")
+    bench.add_argument("-k", type=int, default=1)
+    bench.add_argument(
+        "--model-id", help="Embedding model, if the index does not record it"
+    )
+    args = parser.parse_args()
+
+    # Only the clients: the app configuration would load the local index,
+    # which may be the file being built
+    load_dotenv()
+    config = create_clients()
+    if args.command == "build":
+        index = build_index(
+            config["bedrock_client"], config["s3_client"], args.prefix, args.model_id
+        )
+        index.save(args.output)
+        print(f"Saved {len(index)} entries to {args.output}")
+    else:
+        with open(args.queries) as file:
+            queries = [line.strip() for line in file if line.strip()]
+        index = LocalVectorIndex.load(args.index)
+        asyncio.run(compare(config, index, queries, args.k, args.model_id))
+
+
+if __name__ == "__main__":
+    main()
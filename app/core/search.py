@@ -0,0 +1,147 @@
+import asyncio
+import time
+from app.core.metrics import timed
+from app.core.storage import PRODUCT_BUCKET, get_images_batch
+
+KNOWLEDGE_BASE_ID = "53EOF738SO"
+
+
+class ProductSearch:
+    """
+    Search the product knowledge base with overlapping stages.
+
+    Prompt optimization starts first. Retrieval waits for it for at most
+    ``optimize_deadline`` seconds, then runs with the optimized prompt if it
+    is ready and with the raw query otherwise. Optimization keeps running
+    while retrieval and image hydration proceed, and the response reports it
+    only if it finished by then. The search never waits for it: a slower
+    optimization runs on in the background, so it still fills the prompt
+    cache, and ``optimized_prompt`` is null.
+
+    Args:
+        invoker (BedrockInvoker): The shared Bedrock invoker.
+        optimizer (PromptOptimizer): The prompt optimizer.
+        bedrock_agent: The ``bedrock-agent-runtime`` boto3 client.
+        s3_client: The boto3 S3 client.
+        product_cache (ProductImageCache): Optional product cache.
+        optimize_deadline (float): Seconds retrieval waits for the optimizer.
+        knowledge_base_id (str): The Bedrock knowledge base to query.
+        retriever (LocalRetriever): Optional in-process retriever used
+            instead of the knowledge base.
+    """
+
+    def __init__(
+        self,
+        invoker,
+        optimizer,
+        bedrock_agent,
+        s3_client,
+        product_cache=None,
+        optimize_deadline=1.5,
+        knowledge_base_id=KNOWLEDGE_BASE_ID,
+        retriever=None,
+    ):
+        self.invoker = invoker
+        self.optimizer = optimizer
+        self.bedrock_agent = bedrock_agent
+        self.s3_client = s3_client
+        self.product_cache = product_cache
+        self.optimize_deadline = optimize_deadline
+        self.knowledge_base_id = knowledge_base_id
+        self.retriever = retriever
+        # Strong references to optimizations outliving their search
+        self._background = set()
+
+    async def retrieve(self, query, number_of_results):
+        """
+        Query the knowledge base, or the local index when configured.
+
+        Returns:
+            dict: The ``retrieve`` response with ``retrievalResults``.
+        """
+        if self.retriever is not None:
+            return await self.retriever.retrieve(query, number_of_results)
+        return await self.invoker.run(
+            self.knowledge_base_id,
+            self.bedrock_agent.retrieve,
+            knowledgeBaseId=self.knowledge_base_id,
+            retrievalQuery={"text": query},
+            retrievalConfiguration={
+                "vectorSearchConfiguration": {"numberOfResults": number_of_results}
+            },
+        )
+
+    def _optimized_in_background(self, task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"Error optimizing search prompt: {task.exception()}")
+
+    async def search(self, query, number_of_results=1):
+        """
+        Run the search and report when each stage finished, in seconds since
+        the search started (``optimize`` can finish after ``retrieve``).
+
+        Args:
+            query (str): The user query.
+            number_of_results (int): Knowledge base results to hydrate.
+
+        Returns:
+            dict: The ``/search`` response payload.
+        """
+        started = time.perf_counter()
+        timings = {}
+
+        def elapsed():
+            return round(time.perf_counter() - started, 4)
+
+        optimize_task = asyncio.create_task(self.optimizer.optimize("search", query))
+        optimize_task.add_done_callback(
+            lambda _: timings.setdefault("optimize", elapsed())
+        )
+        await asyncio.wait({optimize_task}, timeout=self.optimize_deadline)
+        retrieval_query = query
+        if (
+            optimize_task.done()
+            and not optimize_task.exception()
+            and optimize_task.result()
+        ):
+            retrieval_query = optimize_task.result()
+
+        with timed("retrieve"):
+            response = await self.retrieve(retrieval_query, number_of_results)
+        timings["retrieve"] = elapsed()
+
+        object_keys = []
+        for result in response["retrievalResults"]:
+            if "location" in result and "s3Location" in result["location"]:
+                s3_uri = result["location"]["s3Location"]["uri"]
+                object_keys.append(s3_uri.replace(f"s3://{PRODUCT_BUCKET}/", ""))
+
+        # Hydrate every result at once instead of one after another, on the
+        # image fetch pool rather than the Bedrock executor
+        with timed("hydrate"):
+            image_lists = await get_images_batch(
+                self.s3_client, object_keys, self.product_cache
+            )
+        results = [{"image_urls": images} for images in image_lists]
+        timings["hydrate"] = elapsed()
+
+        optimized_prompt = None
+        if optimize_task.done():
+            if optimize_task.exception():
+                print(f"Error optimizing search prompt: {optimize_task.exception()}")
+            else:
+                optimized_prompt = optimize_task.result()
+        else:
+            self._background.add(optimize_task)
+            optimize_task.add_done_callback(self._optimized_in_background)
+        timings["total"] = elapsed()
+
+        return {
+            "original_prompt": query,
+            "optimized_prompt": optimized_prompt,
+            "retrieval_query": retrieval_query,
+            "results": results,
+            "s3_locations": [],
+            "timings": timings,
+        }
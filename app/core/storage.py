@@ -1,22 +1,88 @@
+import asyncio
 import base64
-import requests
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.core.metrics import timed
+from app.core.clients import _env_number
 
+PRODUCT_BUCKET = "cm-product-2025"
 
-def get_s3_object(s3, bucket_name, object_key):
+_http_session = None
+_fetch_executor = None
+_product_executor = None
+# (connect, read) timeout in seconds, set with the session
+_fetch_timeout = None
+_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Return the shared keep-alive session used to download product images,
+    creating it (and the fetch thread pools) on first use.
+
+    The settings are read from the environment here rather than at import,
+    so values loaded from ``.env`` by ``load_configuration`` apply:
+    ``IMAGE_FETCH_POOL_SIZE`` connections kept alive per image host,
+    ``IMAGE_FETCH_WORKERS`` concurrent downloads overall, the
+    ``IMAGE_FETCH_CONNECT_TIMEOUT`` / ``IMAGE_FETCH_READ_TIMEOUT`` seconds,
+    and ``PRODUCT_FETCH_WORKERS`` concurrent product object loads from S3.
+    Product objects get their own pool so they never queue behind image
+    downloads waiting for a connection.
+
+    ``pool_block`` makes callers wait for a free connection instead of
+    opening more than ``IMAGE_FETCH_POOL_SIZE`` connections to one host.
+    """
+    global _http_session, _fetch_executor, _product_executor, _fetch_timeout
+    with _lock:
+        if _http_session is None:
+            # requests is only imported once product images are fetched
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            pool_size = _env_number("IMAGE_FETCH_POOL_SIZE", 10, int)
+            workers = _env_number("IMAGE_FETCH_WORKERS", 16, int)
+            product_workers = _env_number("PRODUCT_FETCH_WORKERS", 32, int)
+            _fetch_timeout = (
+                _env_number("IMAGE_FETCH_CONNECT_TIMEOUT", 3, float),
+                _env_number("IMAGE_FETCH_READ_TIMEOUT", 10, float),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                pool_block=True,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+            _fetch_executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="image-fetch"
+            )
+            _product_executor = ThreadPoolExecutor(
+                max_workers=product_workers, thread_name_prefix="product-fetch"
+            )
+    return _http_session
+
+
+def get_s3_object(s3, bucket_name, object_key, cache=None):
     """
     Fetch an object from S3 and return its content.
 
     Args:
         bucket_name (str): The name of the S3 bucket.
         object_key (str): The key of the object in the S3 bucket.
+        cache (ProductImageCache): Optional cache of parsed objects.
 
     Returns:
         str: The content of the S3 object.
     """
-    response = s3.get_object(Bucket=bucket_name, Key=object_key)
-    content = response["Body"].read().decode("utf-8")
-    return json.loads(content)
+    with timed("s3_fetch"):
+        if cache is not None:
+            return cache.get_object(s3, bucket_name, object_key)
+        response = s3.get_object(Bucket=bucket_name, Key=object_key)
+        # json accepts the raw bytes, no need for a decoded copy of the body
+        return json.loads(response["Body"].read())
 
 
 def get_image_urls(product_data):
@@ -32,49 +98,151 @@ def get_image_urls(product_data):
     return product_data[0].get("image_urls", [])
 
 
-def download_images_to_base64(image_urls, with_data_uri=False):
+def download_images_to_base64(image_urls, with_data_uri=False, cache=None):
     """
     Download images from a list of URLs, convert them to base64, and return a list of base64 strings.
 
+    Images are fetched concurrently over a shared keep-alive session.
+
     Args:
         image_urls (list): List of image URLs.
         with_data_uri (bool): Whether to include MIME type prefix (useful for HTML embedding).
+        cache (ProductImageCache): Optional cache of downloaded images.
 
     Returns:
         list: List of base64-encoded image strings (or data URIs if with_data_uri=True).
     """
-    base64_list = []
+    session = get_http_session()
+    # Downloads run concurrently; map keeps the results in input order
+    return list(
+        _fetch_executor.map(
+            lambda url: _download_image(session, url, with_data_uri, cache),
+            image_urls[:3],
+        )
+    )
+
 
-    for url in image_urls[:3]:
-        try:
-            # Download the image
-            response = requests.get(url)
-            response.raise_for_status()  # Raise exception if download failed
+def _download_image(session, url, with_data_uri, cache):
+    with timed("image_fetch"):
+        return _fetch_image(session, url, with_data_uri, cache)
 
-            # Encode image content to base64
-            encoded_string = base64.b64encode(response.content).decode("utf-8")
 
-            if with_data_uri:
-                # Try to detect the MIME type from the response header
-                mime_type = response.headers.get(
-                    "Content-Type", "application/octet-stream"
-                )
-                encoded_string = f"data:{mime_type};base64,{encoded_string}"
+def _fetch_image(session, url, with_data_uri, cache):
+    try:
+        if cache is not None:
+            data_uri = cache.fetch_image(session, url, timeout=_fetch_timeout)
+            return data_uri if with_data_uri else data_uri.split(",", 1)[1]
 
-            base64_list.append(encoded_string)
+        # Download the image
+        response = session.get(url, timeout=_fetch_timeout)
+        response.raise_for_status()  # Raise exception if download failed
 
-        except Exception as e:
-            print(f"Error downloading or encoding image from {url}: {e}")
-            # Add None if failed, or you can choose to skip
-            base64_list.append(None)
+        # Encode image content to base64
+        encoded_string = base64.b64encode(response.content).decode("utf-8")
 
-    return base64_list
+        if with_data_uri:
+            # Try to detect the MIME type from the response header
+            mime_type = response.headers.get("Content-Type", "application/octet-stream")
+            encoded_string = f"data:{mime_type};base64,{encoded_string}"
 
+        return encoded_string
 
-def get_images(s3, object_key):
+    except Exception as e:
+        print(f"Error downloading or encoding image from {url}: {e}")
+        # Add None if failed, or you can choose to skip
+        return None
 
-    bucket_name = "cm-product-2025"
-    product_data = get_s3_object(s3, bucket_name, object_key)
+
+async def get_images_batch(s3, object_keys, cache=None):
+    """
+    Load several products and their images at once.
+
+    All product objects are fetched concurrently, then every image of every
+    product is downloaded concurrently, so N results cost about the wall time
+    of one. Each fetch is its own task on the product or image fetch pool,
+    so waiting on S3 or the CDN holds no other thread.
+
+    Args:
+        s3: The boto3 S3 client.
+        object_keys (list): Product object keys in ``PRODUCT_BUCKET``.
+        cache (ProductImageCache): Optional product cache.
+
+    Returns:
+        list: One list of image data URIs per key, in input order.
+    """
+    loop = asyncio.get_running_loop()
+    session = get_http_session()
+    products = await asyncio.gather(
+        *[
+            loop.run_in_executor(
+                _product_executor, get_s3_object, s3, PRODUCT_BUCKET, key, cache
+            )
+            for key in object_keys
+        ]
+    )
+    url_lists = [get_image_urls(product_data)[:3] for product_data in products]
+    images = await asyncio.gather(
+        *[
+            loop.run_in_executor(
+                _fetch_executor, _download_image, session, url, True, cache
+            )
+            for urls in url_lists
+            for url in urls
+        ]
+    )
+    results = []
+    for urls in url_lists:
+        results.append(images[: len(urls)])
+        images = images[len(urls) :]
+    return results
+
+
+def warm_product_cache(s3, cache, prefix=""):
+    """
+    Load the product objects under ``prefix`` into the cache, so the first
+    searches after startup do not pay for the S3 round trips.
+
+    Loading stops at the cache capacity: past it, every object loaded would
+    evict one loaded earlier, wasting the startup S3 traffic.
+
+    Args:
+        s3: The boto3 S3 client.
+        cache (ProductImageCache): The cache to fill.
+        prefix (str): Key prefix of the product objects.
+
+    Returns:
+        int: Number of objects loaded.
+    """
+    get_http_session()
+    capacity = cache.objects.max_entries
+    paginator = s3.get_paginator("list_objects_v2")
+    keys = []
+    for page in paginator.paginate(Bucket=PRODUCT_BUCKET, Prefix=prefix):
+        keys.extend(
+            item["Key"]
+            for item in page.get("Contents", [])
+            if item["Key"].endswith(".json")
+        )
+        if len(keys) > capacity:
+            print(
+                f"Product catalogue exceeds the cache capacity, prefetching "
+                f"the first {capacity} objects only (PRODUCT_CACHE_ENTRIES)"
+            )
+            keys = keys[:capacity]
+            break
+    for _ in _product_executor.map(
+        lambda key: get_s3_object(s3, PRODUCT_BUCKET, key, cache), keys
+    ):
+        pass
+    return len(keys)
+
+
+def get_images(s3, object_key, cache=None):
+
+    bucket_name = PRODUCT_BUCKET
+    product_data = get_s3_object(s3, bucket_name, object_key, cache)
     image_urls = get_image_urls(product_data)
-    base64_images = download_images_to_base64(image_urls, with_data_uri=True)
+    base64_images = download_images_to_base64(
+        image_urls, with_data_uri=True, cache=cache
+    )
     return base64_images
@@ -0,0 +1,105 @@
+import asyncio
+import random
+import time
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException"}
+TRANSIENT_CODES = {
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+}
+
+
+class ThrottledError(Exception):
+    """Bedrock kept throttling, or the local queue wait ran out."""
+
+
+def error_code(error):
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code")
+    return None
+
+
+def is_throttling(error):
+    return error_code(error) in THROTTLING_CODES
+
+
+def is_retryable(error):
+    if isinstance(error, (ConnectionError, HTTPClientError)):
+        return True
+    return error_code(error) in THROTTLING_CODES | TRANSIENT_CODES
+
+
+def backoff_delay(attempt, base=0.5, cap=20.0):
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at ``per_minute`` tokens a minute, holding up to
+    ten seconds' worth. Waiters are served one at a time, oldest first.
+
+    The effective rate adapts: each throttle reported by Bedrock halves it,
+    down to 10% of the configured rate, and each success restores 5%.
+
+    Args:
+        per_minute (float): Configured tokens (requests or model tokens) per minute.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.capacity = max(per_minute / 6, 1.0)
+        self.tokens = self.capacity
+        self.scale = 1.0
+        self.updated = time.monotonic()
+        self._lock = None
+
+    @property
+    def rate(self):
+        return self.per_minute * self.scale / 60
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost, deadline):
+        """
+        Take ``cost`` tokens, waiting for the refill if needed.
+
+        Args:
+            cost (float): Tokens to take; capped at the bucket capacity.
+            deadline (float): ``time.monotonic()`` value to give up at.
+
+        Raises:
+            ThrottledError: When the tokens would not be available in time.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        cost = min(cost, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                wait = (cost - self.tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    raise ThrottledError("Request queue wait exceeded")
+                await asyncio.sleep(wait)
+
+    def available(self):
+        """Tokens currently in the bucket."""
+        self._refill()
+        return self.tokens
+
+    def throttled(self):
+        self._refill()
+        self.scale = max(self.scale / 2, 0.1)
+
+    def succeeded(self):
+        self._refill()
+        self.scale = min(self.scale + 0.05, 1.0)
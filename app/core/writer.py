@@ -0,0 +1,133 @@
+import asyncio
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from app.core.metrics import timed
+from app.core.outputs import LocalOutputStore
+from app.utils import save_image, transcode_image
+from app.core.clients import _env_flag, _env_number
+
+
+def log_write_failure(image_paths, error):
+    if error is not None:
+        print(f"Error writing images {image_paths}: {error}")
+
+
+class ImageWriter:
+    """
+    Decode and write generated images on a dedicated thread pool, every
+    image of a response at the same time.
+
+    With ``write_behind`` the response does not wait for the files: the
+    writes finish in the background and ``on_written(image_paths, error)``
+    is called once all images of a response are on disk (``error`` is None)
+    or one of them failed. ``wait(path)`` lets a reader block until a
+    pending file is complete.
+
+    Every written file is handed to the output ``store``, which uploads it
+    in the background when it is remote.
+
+    Args:
+        workers (int): Threads writing images.
+        output_format (str): Format images are saved in, ``png`` keeps the
+            model output untouched.
+        thumbnail_size (int): Optional bound of the saved images' longest side.
+        write_behind (bool): Return before the writes are durable.
+        on_written (callable): Completion hook for write-behind writes.
+        store (LocalOutputStore or S3OutputStore): Where the images end up.
+    """
+
+    def __init__(
+        self,
+        workers=4,
+        output_format="png",
+        thumbnail_size=None,
+        write_behind=False,
+        on_written=log_write_failure,
+        store=None,
+    ):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="writer"
+        )
+        self.output_format = output_format
+        self.thumbnail_size = thumbnail_size
+        self.write_behind = write_behind
+        self.on_written = on_written
+        self.store = store or LocalOutputStore()
+        self._pending = {}
+
+    def _write(self, base64_image, image_path):
+        with timed("decode"):
+            image_bytes = base64.b64decode(base64_image)
+        with timed("write"):
+            if self.output_format != "png" or self.thumbnail_size:
+                transcode_image(
+                    image_bytes, image_path, self.output_format, self.thumbnail_size
+                )
+            else:
+                save_image(image_bytes, image_path)
+        self.store.upload(image_path)
+
+    async def write(self, images, image_paths):
+        """
+        Write ``images`` (base64 strings) to ``image_paths`` concurrently.
+
+        Returns once every file is written, or right away with ``write_behind``.
+        """
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(self.executor, self._write, image, path)
+            for image, path in zip(images, image_paths)
+        ]
+        if not self.write_behind:
+            await asyncio.gather(*futures)
+            return
+        for path, future in zip(image_paths, futures):
+            self._pending[path] = future
+        batch = asyncio.gather(*futures)
+        batch.add_done_callback(lambda done: self._written(image_paths, done))
+
+    def _written(self, image_paths, batch):
+        for path in image_paths:
+            self._pending.pop(path, None)
+        error = batch.exception() if not batch.cancelled() else None
+        if self.on_written is not None:
+            self.on_written(image_paths, error)
+
+    async def wait(self, image_path):
+        """Wait for a pending write-behind write of ``image_path``, if any."""
+        future = self._pending.get(image_path)
+        if future is not None:
+            await asyncio.wait({future})
+
+    async def flush(self):
+        """Wait for every pending write-behind write."""
+        if self._pending:
+            await asyncio.wait(set(self._pending.values()))
+
+    def stats(self):
+        return {
+            "write_behind": self.write_behind,
+            "pending": len(self._pending),
+            "store": self.store.stats(),
+        }
+
+
+def create_image_writer(output_format="png", thumbnail_size=None, store=None):
+    """
+    Build the image writer from environment settings.
+
+    Args:
+        output_format (str): Format images are saved in.
+        thumbnail_size (int): Optional bound of the saved images' longest side.
+        store (LocalOutputStore or S3OutputStore): Where the images end up.
+
+    Returns:
+        ImageWriter: The image writer.
+    """
+    return ImageWriter(
+        workers=_env_number("IMAGE_WRITER_WORKERS", 4, int),
+        output_format=output_format,
+        thumbnail_size=thumbnail_size,
+        write_behind=_env_flag("IMAGE_WRITE_BEHIND", False),
+        store=store,
+    )
@@ -4,7 +4,7 @@ from app.app import app
 if __name__ == "__main__":
     # Uvicorn configuration for development
     uvicorn.run(
-        "main:app",
+        "app.app:app",
         host="0.0.0.0",
         port=8000,
         reload=True,
@@ -6,13 +6,17 @@ from .models import (
     BackgroundRemovalRequest,
     ImageVariationRequest,
     InPaintingRequest,
+    OutPaintingRequest,
     QualityEnum,
     ControlModeEnum,
+    OutPaintingModeEnum,
+    ResponseModeEnum,
     ImageGenerationConfig,
     TextImageParams,
     BackgroundRemovalParams,
     ImageVariationParams,
     InPaintingParams,
+    OutPaintingParams,
 )
 
 __all__ = [
@@ -22,11 +26,15 @@ __all__ = [
     "BackgroundRemovalRequest",
     "ImageVariationRequest",
     "InPaintingRequest",
+    "OutPaintingRequest",
     "QualityEnum",
     "ControlModeEnum",
+    "OutPaintingModeEnum",
+    "ResponseModeEnum",
     "ImageGenerationConfig",
     "TextImageParams",
     "BackgroundRemovalParams",
     "ImageVariationParams",
     "InPaintingParams",
+    "OutPaintingParams",
 ]
@@ -17,6 +17,17 @@ class TaskTypeEnum(str, Enum):
     # Add other task types here as needed: INPAINTING, OUTPAINTING, etc.
 
 
+class OutPaintingModeEnum(str, Enum):
+    DEFAULT = "DEFAULT"
+    PRECISE = "PRECISE"
+
+
+class ResponseModeEnum(str, Enum):
+    inline = "inline"
+    reference = "reference"
+    both = "both"
+
+
 class ControlModeEnum(str, Enum):
     CANNY_EDGE = "CANNY_EDGE"
     SEGMENTATION = "SEGMENTATION"
@@ -36,7 +47,10 @@ class ImageGenerationConfig(BaseModel):
         6.5, ge=1.1, le=10, description="How closely the prompt will be followed"
     )
     seed: Optional[int] = Field(
-        0, ge=0, le=858993459, description="Seed for reproducibility"
+        None,
+        ge=0,
+        le=858993459,
+        description="Seed for reproducibility, generated by the server when omitted",
     )
     quality: QualityEnum = QualityEnum.premium
 
@@ -98,6 +112,31 @@ class InPaintingParams(BaseModel):
     )
 
 
+class OutPaintingParams(BaseModel):
+    text: str = Field(
+        ..., min_length=1, description="Text prompt describing the image to generate"
+    )
+    negativeText: str = Field(
+        None, description="What to avoid generating outside the mask"
+    )
+    image: str = Field(
+        ...,
+        description="image to extend, base64 encoded. The image must be in the same size as the mask.",
+    )
+    maskPrompt: str = Field(
+        None,
+        description="A description of the area(s) of the image to keep. The mask must be in the same size as the image.",
+    )
+    maskImage: str = Field(
+        None,
+        description="A mask image that indicates the area(s) of the image to keep. The mask must be in the same size as the image.",
+    )
+    outPaintingMode: OutPaintingModeEnum = Field(
+        None,
+        description="Whether to allow modification of the pixels inside the mask",
+    )
+
+
 class ImageVariationRequest(BaseModel):
     imageVariationParams: ImageVariationParams
     imageGenerationConfig: ImageGenerationConfig
@@ -119,6 +158,23 @@ class InPaintingRequest(BaseModel):
     imageGenerationConfig: ImageGenerationConfig = ImageGenerationConfig()
 
 
+class OutPaintingRequest(BaseModel):
+    taskType: TaskTypeEnum = TaskTypeEnum.OUTPAINTING
+    outPaintingParams: OutPaintingParams
+    imageGenerationConfig: ImageGenerationConfig = ImageGenerationConfig()
+
+
 class ImageResponse(BaseModel):
     image_paths: List[str]
-    base64_images: List[str]
+    image_urls: List[str] = Field(
+        [], description="Download URLs of the saved images, relative to the API root"
+    )
+    base64_images: Optional[List[str]] = Field(
+        None, description="Inline images, omitted when response_mode=reference"
+    )
+    object_keys: List[str] = Field(
+        [], description="Stable keys of the images in the configured output storage"
+    )
+    seed: Optional[int] = Field(
+        None, description="Seed used for the generation, pass it back to replay"
+    )
@@ -0,0 +1,341 @@
+"""
+Offline benchmark of the API routes against stub AWS clients.
+
+Boots the app with ``create_app`` in process and drives each route at
+one or more concurrency levels, then reports requests per second and
+latency percentiles, plus the peak RSS of the whole run::
+
+    python -m benchmarks.run --requests 200 --concurrency 16
+    python -m benchmarks.run --routes search --concurrency 1 4 16 64
+    python -m benchmarks.run --routes search --product-cache
+    python -m benchmarks.run --routes text-to-image --output-storage s3
+    python -m benchmarks.run --routes text-to-image search --json results.json
+    python -m benchmarks.run --check baseline.json --tolerance 0.25
+    python -m benchmarks.run --routes search --s3-latency 0.5 \
+        --concurrency 6 24 --min-scaling 1.8
+
+With several ``--concurrency`` levels each route is swept from the lowest
+to the highest, which shows how throughput scales with the requests in
+flight. With ``--check`` the run fails when a route's p95 grew, or its
+throughput dropped, at any level by more than the tolerance compared to a
+previous ``--json`` result. With ``--min-scaling`` it fails when a route's
+throughput at the highest level is less than that many times its
+throughput at the lowest, i.e. when requests queue instead of overlapping.
+
+Product images for ``/search`` are served by a local HTTP server, so the
+image fetch, product cache and hydration paths run as in production.
+With ``--output-storage s3`` generated images are uploaded to the stub S3
+in the background; the run then also fails if an upload failed, a local
+copy was left behind, or ``/images`` does not redirect to the presigned URL.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import httpx
+import numpy as np
+from benchmarks.stubs import (
+    StubBedrockAgentRuntime,
+    StubBedrockRuntime,
+    StubImageServer,
+    StubS3,
+    noise_png,
+)
+
+OUTPUT_BUCKET = "bench-output"
+
+ROUTES = ["text-to-image", "inpainting", "variation", "remove-bg", "search"]
+
+
+def build_config(args, output_dir, image_urls):
+    from app.core.invoker import create_invoker
+    from app.core.outputs import S3OutputStore
+    from app.core.product_cache import ProductImageCache
+    from app.core.writer import ImageWriter
+
+    bedrock = StubBedrockRuntime(
+        latency=args.latency,
+        image_size=args.image_size,
+        throttle_rate=args.throttle_rate,
+    )
+    s3 = StubS3(
+        latency=args.s3_latency,
+        image_urls=image_urls,
+        payload_size=args.s3_payload_size,
+        throttle_rate=args.s3_throttle_rate,
+    )
+    product_cache = None
+    if args.product_cache:
+        product_cache = ProductImageCache(f"{output_dir}/product-cache")
+    store = None
+    if args.output_storage == "s3":
+        store = S3OutputStore(s3, OUTPUT_BUCKET, prefix="generated/")
+    return {
+        "bedrock_client": bedrock,
+        "invoker": create_invoker(bedrock),
+        "bedrock_agent_client": StubBedrockAgentRuntime(latency=args.retrieve_latency),
+        "s3_client": s3,
+        "product_cache": product_cache,
+        "image_model": "amazon.nova-canvas-v1:0",
+        "output_dir": output_dir,
+        "image_writer": ImageWriter(store=store),
+    }
+
+
+async def check_output_store(client, config, output_dir):
+    """
+    Wait for the background uploads of a run, then return the problems of
+    the S3 output path.
+    """
+    writer, s3 = config["image_writer"], config["s3_client"]
+    store = writer.store
+    await writer.flush()
+    await asyncio.to_thread(store.executor.shutdown)
+    problems = []
+    if store.failed:
+        problems.append(f"s3 output: {store.failed} uploads failed")
+    left = [name for name in os.listdir(output_dir) if name.endswith(".png")]
+    # A failed upload keeps its local copy on purpose
+    if len(left) > store.failed:
+        problems.append(
+            f"s3 output: {len(left) - store.failed} local copies left after upload"
+        )
+    redirect = "skipped"
+    if s3.uploads:
+        key = next(iter(s3.uploads)).split("/", 1)[1]
+        response = await client.get(f"/images/{key[len(store.prefix) :]}")
+        redirect = response.headers.get("location")
+        if response.status_code != 307 or redirect != store.url(key):
+            problems.append(
+                f"s3 output: /images answered {response.status_code} "
+                f"{redirect}, expected a redirect to {store.url(key)}"
+            )
+    print(
+        f"s3 output: uploaded {len(s3.uploads)}, failed {store.failed}, "
+        f"local copies left {len(left)}, redirect {redirect}"
+    )
+    return problems
+
+
+def request_factory(route, args):
+    """Return ``make(i)`` building the i-th request of a route."""
+    image = noise_png(args.input_size)
+    config = {"numberOfImages": args.images, "quality": "standard"}
+    params = {"response_mode": args.response_mode}
+
+    def make(i):
+        # A distinct prompt per request keeps coalescing and caches out of the way
+        prompt = f"a gaming computer case, variant {i}"
+        if route == "text-to-image":
+            body = {
+                "textImageParams": {"text": prompt},
+                "imageGenerationConfig": config,
+            }
+        elif route == "inpainting":
+            body = {
+                "inPaintingParams": {
+                    "text": prompt,
+                    "image": image,
+                    "maskPrompt": "case",
+                },
+                "imageGenerationConfig": config,
+            }
+        elif route == "variation":
+            body = {
+                "imageVariationParams": {"text": prompt, "images": [image]},
+                "imageGenerationConfig": config,
+            }
+        elif route == "remove-bg":
+            body = {"backgroundRemovalParams": {"image": image}}
+        else:
+            return "POST", "/search", {"request": prompt, "number_of_results": 3}, None
+        return "POST", f"/{route}", params, body
+
+    return make
+
+
+async def drive(client, make, total, concurrency):
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, path, params, body = make(i)
+            started = time.perf_counter()
+            response = await client.request(method, path, params=params, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors, time.perf_counter() - started
+
+
+def peak_rss_mb():
+    # ru_maxrss is the peak of the whole process, in kilobytes on Linux and
+    # bytes on macOS, so it cannot be attributed to a single route
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+async def run(args):
+    from app.app import create_app
+
+    results, problems = {}, []
+    image_server = StubImageServer(args.cdn_latency, args.product_image_size)
+    with tempfile.TemporaryDirectory() as output_dir, image_server:
+        image_urls = image_server.urls(args.product_images)
+        config = build_config(args, output_dir, image_urls)
+        app = create_app(config)
+        # Unhandled route errors count as failed requests instead of aborting
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            for route in args.routes:
+                make = request_factory(route, args)
+                results[route] = {}
+                for concurrency in sorted(args.concurrency):
+                    # Warm-up requests are not measured
+                    await drive(client, make, concurrency, concurrency)
+                    latencies, errors, elapsed = await drive(
+                        client, make, args.requests, concurrency
+                    )
+                    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+                    results[route][str(concurrency)] = {
+                        "requests": len(latencies),
+                        "errors": errors,
+                        "rps": len(latencies) / elapsed,
+                        "p50_ms": p50,
+                        "p95_ms": p95,
+                        "p99_ms": p99,
+                    }
+            if args.output_storage == "s3":
+                problems = await check_output_store(client, config, output_dir)
+    return results, problems
+
+
+def report(results):
+    print(
+        f"{'route':<15}{'conc':>6}{'requests':>9}{'errors':>8}{'rps':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    )
+    for route, levels in results.items():
+        for concurrency, result in levels.items():
+            print(
+                f"{route:<15}{concurrency:>6}{result['requests']:>9}"
+                f"{result['errors']:>8}{result['rps']:>9.1f}"
+                f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                f"{result['p99_ms']:>9.1f}"
+            )
+
+
+def check(results, baseline, tolerance):
+    """Return the regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for route, levels in results.items():
+        for concurrency, result in levels.items():
+            before = baseline.get(route, {}).get(concurrency)
+            if before is None:
+                continue
+            name = f"{route} x{concurrency}"
+            if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms"
+                )
+            if result["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{name}: rps {before['rps']:.1f} -> {result['rps']:.1f}"
+                )
+    return regressions
+
+
+def check_scaling(results, min_scaling):
+    """Return the routes whose throughput did not scale across the sweep."""
+    failures = []
+    for route, levels in results.items():
+        if len(levels) < 2:
+            continue
+        lowest, highest = min(levels, key=int), max(levels, key=int)
+        scaling = levels[highest]["rps"] / levels[lowest]["rps"]
+        if scaling < min_scaling:
+            failures.append(
+                f"{route}: rps x{scaling:.2f} from {lowest} to {highest} "
+                f"in flight, expected at least x{min_scaling:.2f}"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--routes", nargs="+", choices=ROUTES, default=ROUTES)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[8],
+        help="Requests in flight; several values sweep each route",
+    )
+    parser.add_argument("--latency", type=float, default=0.5, help="Bedrock seconds")
+    parser.add_argument("--retrieve-latency", type=float, default=0.2)
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    parser.add_argument("--s3-payload-size", type=int, default=1024, help="Bytes")
+    parser.add_argument("--s3-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--cdn-latency", type=float, default=0.02)
+    parser.add_argument("--product-images", type=int, default=3)
+    parser.add_argument("--product-image-size", type=int, default=256)
+    parser.add_argument(
+        "--product-cache", action="store_true", help="Serve products from the cache"
+    )
+    parser.add_argument(
+        "--output-storage",
+        choices=["local", "s3"],
+        default="local",
+        help="Where generated images are stored",
+    )
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--images", type=int, default=1, help="numberOfImages")
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--input-size", type=int, default=512)
+    parser.add_argument(
+        "--response-mode", choices=["inline", "reference", "both"], default="both"
+    )
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--check", help="Baseline results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--min-scaling",
+        type=float,
+        help="Fail if rps at the highest concurrency is below this multiple "
+        "of rps at the lowest",
+    )
+    args = parser.parse_args()
+
+    results, regressions = asyncio.run(run(args))
+    report(results)
+    peak = peak_rss_mb()
+    print(f"peak RSS {peak:.1f} MB")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"routes": results, "peak_rss_mb": peak}, file, indent=2)
+    if args.check:
+        with open(args.check) as file:
+            regressions += check(results, json.load(file)["routes"], args.tolerance)
+    if args.min_scaling:
+        regressions += check_scaling(results, args.min_scaling)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Cold-start benchmark: time importing ``app.main`` (which builds the app)
+and serving a first request, each run in a fresh interpreter::
+
+    python -m benchmarks.startup --runs 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+SNIPPET = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+import httpx
+
+async def first_request():
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/")
+
+asyncio.run(first_request())
+served = time.perf_counter()
+heavy = [name for name in ("numpy", "PIL", "requests", "boto3") if name in sys.modules]
+print(json.dumps({"import_ms": (imported - started) * 1000,
+                  "first_request_ms": (served - imported) * 1000,
+                  "heavy_modules": heavy}))
+"""
+
+
+def measure():
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", SNIPPET],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    summary = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("import_ms", "first_request_ms", "process_ms")
+    }
+    summary["heavy_modules"] = runs[-1]["heavy_modules"]
+    for key, value in summary.items():
+        print(f"{key:<18}{value if key == 'heavy_modules' else f'{value:.1f}'}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Local stand-ins for the boto3 clients the app uses, with configurable
+latency, payload size and throttling rate, and an HTTP server for the
+product images.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from botocore.exceptions import ClientError
+from PIL import Image
+
+
+def noise_png_bytes(size):
+    """A ``size`` x ``size`` PNG of random pixels, close to worst-case size."""
+    pixels = np.random.randint(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def noise_png(size):
+    """``noise_png_bytes`` as base64, the way Bedrock returns images."""
+    return base64.b64encode(noise_png_bytes(size)).decode("ascii")
+
+
+def maybe_throttle(rate, operation, code="ThrottlingException"):
+    if random.random() < rate:
+        raise ClientError(
+            {"Error": {"Code": code, "Message": "Rate exceeded"}}, operation
+        )
+
+
+class StreamingBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, *args):
+        return self.data
+
+
+class StubBedrockRuntime:
+    """
+    ``bedrock-runtime`` stand-in.
+
+    Args:
+        latency (float): Seconds every call takes.
+        image_size (int): Side of the generated images in pixels.
+        throttle_rate (float): Share of calls failing with ``ThrottlingException``.
+        embedding_dim (int): Size of returned embeddings.
+    """
+
+    def __init__(
+        self, latency=0.5, image_size=512, throttle_rate=0.0, embedding_dim=1024
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.uploads = {}
+        self.embedding_dim = embedding_dim
+        self.image = noise_png(image_size)
+        self.calls = 0
+
+    def _call(self, operation):
+        self.calls += 1
+        time.sleep(self.latency)
+        maybe_throttle(self.throttle_rate, operation)
+
+    def invoke_model(self, body, modelId, accept=None, contentType=None):
+        self._call("InvokeModel")
+        request = json.loads(body)
+        if "inputText" in request:
+            response = {"embedding": np.random.rand(self.embedding_dim).tolist()}
+        else:
+            count = request.get("imageGenerationConfig", {}).get("numberOfImages", 1)
+            response = {"images": [self.image] * count}
+        return {"body": StreamingBody(json.dumps(response).encode())}
+
+    def invoke_model_with_response_stream(self, modelId, body):
+        self._call("InvokeModelWithResponseStream")
+        words = "a clear and detailed product photo of a computer case".split()
+        events = [
+            {
+                "chunk": {
+                    "bytes": json.dumps(
+                        {"contentBlockDelta": {"delta": {"text": f"{word} "}}}
+                    ).encode()
+                }
+            }
+            for word in words
+        ]
+        return {"body": events}
+
+
+class StubBedrockAgentRuntime:
+    """``bedrock-agent-runtime`` stand-in returning product objects."""
+
+    def __init__(self, latency=0.2, bucket="cm-product-2025"):
+        self.latency = latency
+        self.bucket = bucket
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration):
+        time.sleep(self.latency)
+        count = retrievalConfiguration["vectorSearchConfiguration"]["numberOfResults"]
+        return {
+            "retrievalResults": [
+                {
+                    "location": {
+                        "type": "S3",
+                        "s3Location": {"uri": f"s3://{self.bucket}/product-{i}.json"},
+                    },
+                    "score": 1.0 - i / 10,
+                }
+                for i in range(count)
+            ]
+        }
+
+
+class StubS3:
+    """
+    S3 stand-in serving product objects and accepting generated image
+    uploads. Uploads are recorded by key and size only.
+
+    Args:
+        latency (float): Seconds every call takes.
+        image_urls (list): Image URLs listed in every product.
+        payload_size (int): Approximate size of each product object in bytes.
+        throttle_rate (float): Share of calls failing with ``SlowDown``.
+    """
+
+    def __init__(
+        self, latency=0.02, image_urls=(), payload_size=1024, throttle_rate=0.0
+    ):
+        self.latency = latency
+        self.image_urls = list(image_urls)
+        self.payload_size = payload_size
+        self.throttle_rate = throttle_rate
+        self.uploads = {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        time.sleep(self.latency)
+        maybe_throttle(self.throttle_rate, "GetObject", "SlowDown")
+        product = {"name": Key, "price": 100, "image_urls": self.image_urls}
+        # Pad the description up to the configured object size
+        padding = self.payload_size - len(json.dumps([product]))
+        product["description"] = "x" * max(padding, 0)
+        return {"Body": StreamingBody(json.dumps([product]).encode()), "ETag": '"stub"'}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None):
+        time.sleep(self.latency)
+        maybe_throttle(self.throttle_rate, "PutObject", "SlowDown")
+        with open(Filename, "rb") as file:
+            self.uploads[f"{Bucket}/{Key}"] = len(file.read())
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        return (
+            f"https://{Params['Bucket']}.s3.stub.local/{Params['Key']}"
+            f"?X-Amz-Expires={ExpiresIn}"
+        )
+
+
+class ImageHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # A deep accept backlog avoids SYN retries under bursts of connections
+    request_queue_size = 128
+
+
+class StubImageServer:
+    """
+    HTTP server on a free local port serving the same PNG at every path,
+    with an ``ETag`` so conditional requests get a ``304``.
+
+    Args:
+        latency (float): Seconds every response takes.
+        image_size (int): Side of the served image in pixels.
+    """
+
+    def __init__(self, latency=0.02, image_size=256):
+        image = noise_png_bytes(image_size)
+        etag = f'"{hashlib.md5(image).hexdigest()}"'
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like a CDN, so the client connection pool is used
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(latency)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(image)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(image)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ImageHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def urls(self, count):
+        host, port = self.server.server_address
+        return [f"http://{host}:{port}/product-{i}.png" for i in range(count)]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()